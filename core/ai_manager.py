@@ -1,143 +1,561 @@
 import os
-from openai import OpenAI
-import google.generativeai as genai
-from typing import Dict, Optional
+import asyncio
+import contextvars
+import hashlib
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
 import json
+from .ai_providers import DEFAULT_MODELS, Usage, create_provider_registry
+from .response_cache import ResponseCache, normalize_question
+from .single_flight import SingleFlight
+from .ai_router import AIRouter
+from .provider_stats import ProviderStats
+from .token_counter import estimate_tokens
+from .chat_history import GroupHistory, HistoryStore
+from .retry_policy import Deadline, RequestDeadlineExceeded, RetryPolicy
+from .provider_health import HealthMonitor
+
+# 调用失败时返回给用户的提示，不写入对话历史
+FAILED_REPLY_PREFIXES = ("AI调用出错", "AI 没有返回有效结果", "AI 响应超时")
+
+# 当前请求所属的群，用于记录调用用量（路由、对冲产生的子任务会继承）
+_current_group: contextvars.ContextVar = contextvars.ContextVar("ai_current_group", default="")
+
+COMPACTION_PROMPT = (
+    "请把下面的群聊对话压缩成一段简洁的摘要，保留关键事实、人物、结论和尚未解决的问题，"
+    "如有已有摘要请合并进去。只输出摘要内容，不超过300字。"
+)
 
 class AIManager:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, db_manager=None):
         self.config = config_manager
-        self.chat_histories: Dict[str, list] = {}
+        self.db = db_manager  # 用于保存各群的对话摘要
+        # 按最近使用淘汰空闲群，被淘汰的群下次访问时从数据库恢复
+        self.chat_histories = HistoryStore.from_settings(self.config.get_history_store_settings())
+        self._hydrating: Dict[str, asyncio.Future] = {}
+        self._compactions: Dict[str, asyncio.Task] = {}
+        self._system = (None, 0, None)  # (提示词, token 数, 所有群共享的系统消息)
+        self.registry = create_provider_registry(self.config)  # 各模型的 SDK 按需导入
+        self.response_cache = ResponseCache.from_settings(self.config.get_response_cache_settings())
+        self.single_flight = SingleFlight()  # 合并相同问题的并发请求
+        self.provider_stats = ProviderStats()  # 各模型的实时耗时/错误率统计，重启后保留
+        self.router = AIRouter(self._request_completion, self.is_model_available,
+                               self.config.get_routing_settings(), self.provider_stats)
+        self.health = HealthMonitor(self._get_provider, self.config.get_health_settings())
         self.setup_models()
 
     def setup_models(self):
-        """初始化各个AI模型的配置"""
+        """初始化各个AI模型的配置（客户端在首次使用或预热时才创建）"""
         # 设置代理
         proxy = self.config.get_proxy()
         if proxy["http"]:
             os.environ["HTTP_PROXY"] = proxy["http"]
             os.environ["HTTPS_PROXY"] = proxy["https"]
 
-        # 初始化DeepSeek
-        self.deepseek_client = OpenAI(
-            api_key=self.config.get_api_key("deepseek"),
-            base_url="https://api.deepseek.com"
+    def _get_provider(self, name: str):
+        """获取模型客户端"""
+        return self.registry.get(name)
+
+    async def prewarm(self):
+        """窗口显示后在后台创建已配置模型的客户端并打开数据库"""
+        await self.registry.prewarm([name for name in self.registry.names if self.config.get_api_key(name)])
+        try:
+            await asyncio.to_thread(self.response_cache.prewarm)
+            if self.db:
+                await asyncio.to_thread(self.db.prewarm)
+        except Exception as e:
+            print(f"数据库预热失败: {e}")
+
+    def start_health_checks(self, on_change=None):
+        """在后台预热已配置模型的连接、探测API密钥是否可用，并定期保持连接"""
+        self.health.settings = self.config.get_health_settings()
+        self.health.start([name for name in self.registry.names if self.config.get_api_key(name)], on_change)
+
+    def stop_health_checks(self):
+        self.health.stop()
+
+    def get_provider_health(self) -> dict:
+        """获取各模型的连接状态和基线耗时"""
+        return self.health.summary()
+
+    async def close(self):
+        """关闭共享连接池并保存模型统计"""
+        self.health.stop()
+        self.provider_stats.save()
+        await self.registry.aclose()
+
+    def _is_cacheable(self, message: str, group_name: str) -> bool:
+        """是否按常见问题处理：配置的常见问题，或无状态群里的所有问题
+
+        这类问题不带对话历史单独回答，回复只取决于问题本身，因此可以缓存复用；
+        问答也不写入群的对话历史。
+        """
+        settings = self.config.get_response_cache_settings()
+        if not settings["enabled"]:
+            return False
+        if group_name in settings["stateless_groups"]:
+            return True
+        question = normalize_question(message)
+        return any(normalize_question(item) == question for item in settings["faq_questions"])
+
+    def _cache_key(self, message: str, model: str, group_name: str) -> str:
+        """生成常见问题的回复缓存键"""
+        scope = group_name if self.config.get_response_cache_settings()["group_scope"] else ""
+        return ResponseCache.make_key(message, self.config.get_system_prompt(), model, scope)
+
+    async def _prepare_messages(self, message: str, group_name: str, model: str, cacheable: bool) -> list:
+        """常见问题只带系统提示词；其他问题先写入对话历史，再带上历史和摘要"""
+        if cacheable:
+            return [self._system_message(), {"role": "user", "content": message}]
+        await self.load_chat_history(group_name)
+        self.update_chat_history(group_name, "user", message, model)
+        return self.get_chat_history(group_name)
+
+    def _store_cached(self, cache_key: Optional[str], response: str, model: str):
+        """在后台线程中写入回复缓存"""
+        if cache_key:
+            asyncio.get_running_loop().run_in_executor(None, self.response_cache.put, cache_key, response, model)
+
+    def get_cache_stats(self) -> dict:
+        """获取回复缓存命中统计"""
+        return self.response_cache.get_stats()
+
+    def _single_flight_key(self, message: str, model: str, group_name: str, cacheable: bool) -> Optional[str]:
+        """生成跨群的请求合并键，关闭或问题依赖上下文时返回 None
+
+        共享的调用使用第一个请求的消息列表，只有不带历史的常见问题才能跨群合并，
+        否则其他群会拿到基于这个群私有对话的回复；同一个群内的相同问题在分发时合并。
+        """
+        settings = self.config.get_single_flight_settings()
+        if not settings["enabled"] or not cacheable:
+            return None
+        scope = group_name if settings["group_scope"] else ""
+        return ResponseCache.make_key(message, self.config.get_system_prompt(), model, scope)
+
+    def is_model_available(self, model: str) -> bool:
+        """模型是否已配置API密钥"""
+        return model in DEFAULT_MODELS and bool(self.config.get_api_key(model))
+
+    def resolve_model(self, model: Optional[str], group_name: str) -> str:
+        """确定本次请求使用的模型，"auto" 时选择当前表现最好的可用模型"""
+        if not model:
+            model = self.config.config["default_model"]
+        if model != "auto":
+            return model
+
+        allowed = self.config.get_model_allowlist(group_name)
+        order = self.config.get_routing_settings()["failover_order"]
+        candidates = [name for name in order + list(DEFAULT_MODELS)
+                      if self.is_model_available(name) and (not allowed or name in allowed)]
+        candidates = list(dict.fromkeys(candidates))
+        return self.provider_stats.best(candidates) or (allowed or order or list(DEFAULT_MODELS))[0]
+
+    def get_provider_stats(self) -> dict:
+        """获取各模型的 EWMA 耗时、p50/p95/p99、错误率和 tokens/s"""
+        return self.provider_stats.summary()
+
+    def get_routing_stats(self) -> dict:
+        """获取路由统计（熔断状态、对冲和故障转移次数）"""
+        return self.router.get_stats()
+
+    def get_single_flight_stats(self) -> dict:
+        """获取请求合并统计（节省的调用次数等）"""
+        return self.single_flight.get_stats()
+
+    def get_chat_history(self, group_name: str) -> list:
+        """获取指定群的聊天历史（含系统提示词的消息列表）"""
+        history = self.chat_histories.get(group_name)
+        if history is None:
+            return [self._system_message()]
+        return history.messages(self._system_message())
+
+    async def load_chat_history(self, group_name: str):
+        """首次访问某个群时从数据库恢复摘要和最近的问答（未访问的群不占内存也不查询）"""
+        if group_name in self.chat_histories or not self.db:
+            return
+        future = self._hydrating.get(group_name)
+        if future is None:
+            limit = self.config.get_history_store_settings()["hydrate_limit"]
+            future = asyncio.get_running_loop().run_in_executor(
+                None, self.db.load_group_history, group_name, limit
+            )
+            self._hydrating[group_name] = future
+        try:
+            memory, rows = await asyncio.shield(future)
+        except Exception as e:
+            print(f"加载聊天历史失败: {e}")
+            memory, rows = None, []
+        finally:
+            if self._hydrating.get(group_name) is future:
+                del self._hydrating[group_name]
+
+        if group_name in self.chat_histories:
+            return
+        history = self.chat_histories.create(group_name, memory)
+        for message, reply, created_at in rows:
+            created = created_at.timestamp() if created_at else None
+            if self._is_cacheable(message or "", group_name):
+                continue  # 常见问题的问答不进入对话历史
+            if message:
+                history.append("user", message, created)
+            if reply and not reply.startswith(FAILED_REPLY_PREFIXES):
+                history.append("assistant", reply, created)
+
+    def update_chat_history(self, group_name: str, role: str, content: str, model: str = None):
+        """更新聊天历史，并按模型的 token 预算淘汰最早的消息"""
+        history = self.chat_histories.get(group_name)
+        if history is None:
+            history = self.chat_histories.create(group_name)
+        history.append(role, content)
+
+        budget = self.config.get_history_token_budget(model or self.config.config["default_model"])
+        budget -= self._system_prompt_tokens()
+        self._maybe_compact(group_name, history, budget)
+        history.trim(budget)
+        self.chat_histories.update_limits(self.config.get_history_store_settings())
+        self.chat_histories.enforce_limits()
+
+    def get_history_stats(self) -> dict:
+        """获取每个群的对话历史占用（消息数、token 数、内存估算）"""
+        return {
+            "groups": self.chat_histories.memory_usage(),
+            "total_bytes": self.chat_histories.memory_bytes(),
+            "evictions": self.chat_histories.evictions,
+        }
+
+    def _maybe_compact(self, group_name: str, history: GroupHistory, budget: int):
+        """历史接近预算时在后台把较早的消息压缩成摘要，不阻塞当前回复"""
+        settings = self.config.get_history_compaction_settings()
+        if not settings["enabled"] or group_name in self._compactions:
+            return
+        if history.total_tokens + history.memory_tokens < budget * settings["trigger_ratio"]:
+            return
+        keep = settings["keep_recent_turns"]
+        if len(history) <= keep:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        turns = list(history.turns)
+        split = len(turns) - keep
+        # 只按完整的一问一答压缩：保留的部分从用户问题开始，否则这条回复对应的问题已进入摘要，
+        # 而数据库中这一问一答的记录晚于水位线，恢复历史时问题会被重复加载
+        while split < len(turns) and turns[split].role != "user":
+            split += 1
+        compacted = turns[:split]
+        # 第一条未压缩消息的时间：之前的聊天记录都已包含在摘要中，恢复历史时跳过
+        covered_until = datetime.fromtimestamp(turns[split].created) if split < len(turns) else datetime.now()
+        task = loop.create_task(self._compact_history(group_name, history, compacted, covered_until))
+        self._compactions[group_name] = task
+        task.add_done_callback(
+            lambda t: self._compactions.pop(group_name, None) if self._compactions.get(group_name) is t else None
         )
 
-        # 初始化Gemini
-        genai.configure(api_key=self.config.get_api_key("gemini"))
-        self.gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+    async def _compact_history(self, group_name: str, history: GroupHistory, compacted: list,
+                               covered_until: datetime):
+        """用较便宜的模型生成摘要，替换已压缩的消息并保存到数据库"""
+        model = self.config.get_history_compaction_settings()["model"]
+        if not self.is_model_available(model):
+            model = self.resolve_model(None, group_name)
 
-        # 初始化通义千问
-        self.qianwen_client = OpenAI(
-            api_key=self.config.get_api_key("qianwen"),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+        transcript = "\n".join(
+            f"{'用户' if turn.role == 'user' else '助手'}: {turn.content}" for turn in compacted
         )
+        if history.memory:
+            transcript = f"已有摘要：{history.memory}\n\n{transcript}"
+        messages = [
+            {"role": "system", "content": COMPACTION_PROMPT},
+            {"role": "user", "content": transcript},
+        ]
+        _current_group.set(group_name)
+        try:
+            # Gemini 只发送最后一条文本，指令需要包含在里面，否则会直接回答聊天内容
+            summary = await self._request_completion(model, messages, f"{COMPACTION_PROMPT}\n\n{transcript}")
+        except Exception as e:
+            print(f"对话摘要生成失败: {e}")
+            return
+        if not summary:
+            return
 
-    def get_chat_history(self, group_name: str) -> list:
-        """获取指定群的聊天历史"""
-        if group_name not in self.chat_histories:
-            system_prompt = self.config.get_system_prompt()
-            self.chat_histories[group_name] = [
-                {"role": "system", "content": system_prompt}
-            ]
-        return self.chat_histories[group_name]
-
-    def update_chat_history(self, group_name: str, role: str, content: str):
-        """更新聊天历史"""
-        history = self.get_chat_history(group_name)
-        history.append({"role": role, "content": content})
-        
-        # 保持历史记录在合理范围内（最近10条消息）
-        if len(history) > 11:  # system消息+10条对话
-            history = [history[0]] + history[-10:]
-        self.chat_histories[group_name] = history
+        history.replace_with_memory(compacted, summary.strip())
+        if self.db:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.db.save_group_memory, group_name, history.memory, covered_until
+            )
+
+    def _refresh_system_prompt(self):
+        """系统提示词变化时才重新计算 token 数和共享的系统消息"""
+        prompt = self.config.get_system_prompt()
+        if self._system[0] != prompt:
+            self._system = (prompt, estimate_tokens(prompt), {"role": "system", "content": prompt})
+
+    def _system_prompt_tokens(self) -> int:
+        self._refresh_system_prompt()
+        return self._system[1]
+
+    def _system_message(self) -> dict:
+        """所有群共享同一个系统消息，不按群复制"""
+        self._refresh_system_prompt()
+        return self._system[2]
 
     async def get_ai_response(self, message: str, group_name: str, model: str = None) -> Optional[str]:
         """获取AI回复"""
+        _current_group.set(group_name)
+        self.chat_histories.pin(group_name)  # 请求期间不被淘汰，回复写回同一份历史
         try:
-            if not model:
-                model = self.config.config["default_model"]
+            model = self.resolve_model(model, group_name)
 
-            history = self.get_chat_history(group_name)
-            self.update_chat_history(group_name, "user", message)
+            # 常见问题直接使用缓存的回复，不调用API
+            cacheable = self._is_cacheable(message, group_name)
+            cache_key = self._cache_key(message, model, group_name) if cacheable else None
+            if cache_key:
+                cached = await self.response_cache.get_async(cache_key)
+                if cached:
+                    return cached
 
-            response = None
-            if model == "deepseek":
-                response = await self._call_deepseek(history)
-            elif model == "gemini":
-                response = await self._call_gemini(message)
-            elif model == "qianwen":
-                response = await self._call_qianwen(history)
+            # 正在进行中的相同问题共享同一次API调用；路由层负责故障转移和对冲
+            messages = await self._prepare_messages(message, group_name, model, cacheable)
+            self.router.update_settings(self.config.get_routing_settings())
+            allowed = self.config.get_model_allowlist(group_name)
+            deadline = self._new_deadline()  # 所有模型调用和重试共享同一个截止时间
+            flight_key = self._single_flight_key(message, model, group_name, cacheable)
+            if flight_key:
+                response = await self.single_flight.do(
+                    flight_key, lambda: self.router.complete(model, messages, message, allowed, deadline)
+                )
+            else:
+                response = await self.router.complete(model, messages, message, allowed, deadline)
 
             if response:
-                self.update_chat_history(group_name, "assistant", response)
+                if cache_key:
+                    self._store_cached(cache_key, response, model)
+                else:
+                    self.update_chat_history(group_name, "assistant", response, model)
                 return response
             return "AI 没有返回有效结果，请稍后再试"
 
+        except RequestDeadlineExceeded as e:
+            print(f"AI调用超时: {e}")
+            return "AI 响应超时，请稍后再试"
         except Exception as e:
             print(f"AI调用失败: {str(e)}")
             return f"AI调用出错: {str(e)}"
+        finally:
+            self._release_group(group_name)
+
+    def _release_group(self, group_name: str):
+        """请求结束后取消固定，并按上限淘汰其他群"""
+        self.chat_histories.unpin(group_name)
+        self.chat_histories.enforce_limits()
+
+    def _new_deadline(self) -> Deadline:
+        """按配置创建单次请求的截止时间"""
+        return Deadline(self.config.get_retry_settings()["deadline_seconds"])
+
+    def _retry_policy(self) -> RetryPolicy:
+        return RetryPolicy.from_settings(self.config.get_retry_settings())
+
+    async def _request_completion(self, model: str, messages: list, message: str,
+                                  deadline: Optional[Deadline] = None) -> Optional[str]:
+        """在截止时间内调用指定模型获取回复（可重试的错误自动重试）"""
+        deadline = deadline or self._new_deadline()
+        if model == "deepseek":
+            return await self._call_deepseek(messages, deadline)
+        elif model == "gemini":
+            return await self._call_gemini(message, deadline)
+        elif model == "qianwen":
+            return await self._call_qianwen(messages, deadline)
+        return None
+
+    async def stream_ai_response(self, message: str, group_name: str, model: str = None) -> AsyncIterator[str]:
+        """流式获取AI回复，逐段产出文本；完整回复仍写入聊天历史"""
+        self.chat_histories.pin(group_name)
+        try:
+            async for delta in self._stream_ai_response(message, group_name, model):
+                yield delta
+        finally:
+            self._release_group(group_name)
+
+    async def _stream_ai_response(self, message: str, group_name: str, model: str = None) -> AsyncIterator[str]:
+        _current_group.set(group_name)
+        model = self.resolve_model(model, group_name)
+
+        cacheable = self._is_cacheable(message, group_name)
+        cache_key = self._cache_key(message, model, group_name) if cacheable else None
+        if cache_key:
+            cached = await self.response_cache.get_async(cache_key)
+            if cached:
+                yield cached
+                return
+        messages = await self._prepare_messages(message, group_name, model, cacheable)
+
+        # 路由层负责熔断和故障转移：收到第一段之前失败时换下一个模型
+        parts = []
+        ok, error = False, None
+        self.router.update_settings(self.config.get_routing_settings())
+        deadline = self._new_deadline()
+        try:
+            stream = self.router.stream(model, lambda name: self._stream_provider(name, messages, deadline),
+                                        self.config.get_model_allowlist(group_name), deadline)
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+            ok = True
+        except RequestDeadlineExceeded as e:
+            print(f"AI流式调用超时: {e}")
+            error = "AI 响应超时，请稍后再试"
+        except Exception as e:
+            print(f"AI流式调用失败: {str(e)}")
+            error = f"AI调用出错: {str(e)}"
 
-    async def _call_deepseek(self, messages: list) -> Optional[str]:
+        response = "".join(parts).strip()
+        if response:
+            # 中途出错时已发出的部分仍写入历史，但不完整的回复不写入缓存
+            if not cache_key:
+                self.update_chat_history(group_name, "assistant", response, model)
+            elif ok:
+                self._store_cached(cache_key, response, model)
+        else:
+            yield error or "AI 没有返回有效结果，请稍后再试"
+
+    async def _stream_provider(self, name: str, messages: list, deadline: Deadline) -> AsyncIterator[str]:
+        """流式调用单个模型（第一段之前的可重试错误自动重试），每次调用只记录一个结果"""
+        provider = self._get_provider(name)
+        parts = []
+        usage = []
+        outcome = "error"
+        started = time.monotonic()
+        try:
+            stream = self._retry_policy().stream(lambda: provider.stream(messages, usage.append), deadline)
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+            outcome = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except RequestDeadlineExceeded:
+            outcome = "timeout"
+            raise
+        finally:
+            text = "".join(parts).strip()
+            latency = time.monotonic() - started
+            if outcome == "ok" and not text:
+                outcome = "error"
+            if outcome == "ok":
+                self.provider_stats.record_success(name, latency, estimate_tokens(text))
+            elif outcome != "cancelled":
+                self.provider_stats.record_failure(name)
+            self._record_usage(name, provider.model_name, messages, text,
+                               usage[-1] if usage else None, outcome, latency)
+
+    async def _complete(self, name: str, messages: list, deadline: Deadline) -> Optional[str]:
+        """在截止时间内调用模型（可重试的错误自动重试），并记录本次调用的用量"""
+        provider = self._get_provider(name)
+        started = time.monotonic()
+        text, usage, outcome = None, None, "error"
+        try:
+            text, usage = await self._retry_policy().call(lambda: provider.complete_with_usage(messages), deadline)
+            if text:
+                outcome = "ok"
+            return text
+        except asyncio.CancelledError:
+            outcome = "cancelled"  # 对冲落败或请求被取消
+            raise
+        except RequestDeadlineExceeded:
+            outcome = "timeout"
+            raise
+        finally:
+            self._record_usage(name, provider.model_name, messages, text, usage, outcome,
+                               time.monotonic() - started)
+
+    @staticmethod
+    def _prefix_hash(messages: list) -> Optional[str]:
+        """开头的系统消息（提示词、摘要）的指纹；前缀不变才能命中模型的上下文缓存"""
+        prefix = []
+        for item in messages:
+            if item["role"] != "system":
+                break
+            prefix.append(item["content"])
+        if not prefix:
+            return None
+        return hashlib.sha256("\x1f".join(prefix).encode("utf-8")).hexdigest()[:16]
+
+    def _record_usage(self, provider: str, model_name: str, messages: list, text: Optional[str],
+                      usage: Optional[Usage], outcome: str, latency: float):
+        """在后台写入一条调用记录；接口未返回用量时按文本估算（中途失败的调用也计入已生成的部分）"""
+        if not self.db:
+            return
+        estimated = usage is None and bool(text)
+        if estimated:
+            usage = Usage(sum(estimate_tokens(item["content"]) for item in messages), estimate_tokens(text or ""), 0)
+        usage = usage or Usage()
+
+        price = self.config.get_model_pricing(model_name)
+        cost = ((usage.prompt_tokens - usage.cached_tokens) * price.get("input", 0)
+                + usage.cached_tokens * price.get("cached_input", price.get("input", 0))
+                + usage.completion_tokens * price.get("output", 0)) / 1_000_000
+        self.db.add_ai_call_async(
+            group_name=_current_group.get(), provider=provider, model=model_name, outcome=outcome,
+            latency=latency, prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens, estimated=estimated,
+            prefix_hash=self._prefix_hash(messages), cost=cost,
+        )
+
+    def get_usage_rollup(self, group_name: str = None, days: int = 7) -> list:
+        """按天、按群汇总的调用用量和费用"""
+        return self.db.get_usage_rollup(group_name, days) if self.db else []
+
+    async def _call_deepseek(self, messages: list, deadline: Deadline) -> Optional[str]:
         """调用DeepSeek API"""
         try:
             # 确保API密钥存在
-            api_key = self.config.get_api_key("deepseek")
-            if not api_key:
+            if not self.config.get_api_key("deepseek"):
                 print("DeepSeek API密钥未配置")
                 return None
 
-            # 设置API客户端
-            self.deepseek_client = OpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com/v1"  # 修正API端点
-            )
-
-            # 调用API
-            response = self.deepseek_client.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000  # 添加最大token限制
-            )
-
-            # 检查响应
-            if response and response.choices and response.choices[0].message:
-                return response.choices[0].message.content.strip()
-            else:
+            response = await self._complete("deepseek", messages, deadline)
+            if not response:
                 print("DeepSeek API返回空响应")
-                return None
+            return response or None
 
+        except RequestDeadlineExceeded:
+            raise  # 交给调用方返回超时提示
         except Exception as e:
             print(f"DeepSeek API调用详细错误: {str(e)}")
             return None
 
-    async def _call_gemini(self, message: str) -> Optional[str]:
+    async def _call_gemini(self, message: str, deadline: Deadline) -> Optional[str]:
         """调用Gemini API"""
         try:
-            response = self.gemini_model.generate_content(message)
-            return response.text
+            return await self._complete("gemini", [{"role": "user", "content": message}], deadline)
+        except RequestDeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Gemini API调用失败: {e}")
             return None
 
-    async def _call_qianwen(self, messages: list) -> Optional[str]:
+    async def _call_qianwen(self, messages: list, deadline: Deadline) -> Optional[str]:
         """调用通义千问 API"""
         try:
-            response = self.qianwen_client.chat.completions.create(
-                model="qwen-turbo",
-                messages=messages
-            )
-            return response.choices[0].message.content.strip()
+            return await self._complete("qianwen", messages, deadline)
+        except RequestDeadlineExceeded:
+            raise
         except Exception as e:
             print(f"通义千问API调用失败: {e}")
             return None
 
     def clear_chat_history(self, group_name: str):
         """清除指定群的聊天历史"""
-        if group_name in self.chat_histories:
-            system_prompt = self.config.get_system_prompt()
-            self.chat_histories[group_name] = [
-                {"role": "system", "content": system_prompt}
-            ] 
\ No newline at end of file
+        task = self._compactions.pop(group_name, None)
+        if task:
+            task.cancel()
+        history = self.chat_histories.get(group_name)
+        if history is not None:
+            history.clear()
+        if self.db:
+            # 清除前的聊天记录不再恢复到对话历史
+            self.db.save_group_memory(group_name, None, datetime.now())
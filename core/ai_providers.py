@@ -0,0 +1,231 @@
+import asyncio
+import threading
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+
+# 各模型 SDK（openai、google.generativeai）导入较慢，只在首次使用或后台预热时导入
+
+PROVIDER_BASE_URLS = {
+    "deepseek": "https://api.deepseek.com/v1",
+    "qianwen": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+}
+
+DEFAULT_MODELS = {
+    "deepseek": "deepseek-chat",
+    "gemini": "gemini-1.5-flash",
+    "qianwen": "qwen-turbo",
+}
+
+
+class Usage(NamedTuple):
+    """单次调用的 token 用量"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # 命中上下文缓存的提示 token
+
+
+def parse_openai_usage(usage) -> Optional[Usage]:
+    """解析 OpenAI 协议的 usage（兼容 DeepSeek 的 prompt_cache_hit_tokens）"""
+    if usage is None:
+        return None
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+    return Usage(usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0)
+
+
+def parse_gemini_usage(metadata) -> Optional[Usage]:
+    if metadata is None:
+        return None
+    return Usage(getattr(metadata, "prompt_token_count", 0) or 0,
+                 getattr(metadata, "candidates_token_count", 0) or 0,
+                 getattr(metadata, "cached_content_token_count", 0) or 0)
+
+
+def create_http_client(settings: dict) -> "httpx.AsyncClient":
+    """创建所有 OpenAI 兼容接口共享的长连接池"""
+    import httpx
+    limits = httpx.Limits(
+        max_connections=settings.get("max_connections", 20),
+        max_keepalive_connections=settings.get("max_keepalive_connections", 10),
+        keepalive_expiry=settings.get("keepalive_expiry", 60),
+    )
+    timeout = httpx.Timeout(
+        settings.get("read_timeout", 60),
+        connect=settings.get("connect_timeout", 10),
+    )
+    # trust_env 使 HTTP_PROXY/HTTPS_PROXY 环境变量（代理设置）继续生效
+    return httpx.AsyncClient(limits=limits, timeout=timeout, trust_env=True)
+
+
+class OpenAICompatibleProvider:
+    """OpenAI 协议的模型（DeepSeek、通义千问）"""
+
+    def __init__(self, name: str, api_key: str, base_url: str, model: str,
+                 http_client: "httpx.AsyncClient", **params):
+        from openai import AsyncOpenAI
+
+        self.name = name
+        self.api_key = api_key
+        self.model_name = model
+        self.params = params  # temperature、max_tokens 等请求参数
+        # 重试由 RetryPolicy 按请求截止时间统一处理，关闭 SDK 自带的重试
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    async def complete(self, messages: list) -> Optional[str]:
+        """发送对话请求，返回回复文本"""
+        text, _ = await self.complete_with_usage(messages)
+        return text
+
+    async def complete_with_usage(self, messages: list) -> Tuple[Optional[str], Optional[Usage]]:
+        """发送对话请求，返回回复文本和 token 用量"""
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            **self.params
+        )
+        usage = parse_openai_usage(getattr(response, "usage", None))
+        if response and response.choices and response.choices[0].message:
+            return (response.choices[0].message.content or "").strip(), usage
+        return None, usage
+
+    async def probe(self):
+        """需要鉴权的轻量请求（列出模型），同时建立连接池中的连接"""
+        await self.client.models.list()
+
+    async def stream(self, messages: list,
+                     on_usage: Optional[Callable[[Usage], None]] = None) -> AsyncIterator[str]:
+        """流式发送对话请求，逐段返回回复文本；最后一段附带的用量交给 on_usage"""
+        response = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **self.params
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if on_usage and getattr(chunk, "usage", None):
+                on_usage(parse_openai_usage(chunk.usage))
+
+
+class GeminiProvider:
+    """Gemini 模型（SDK 自带连接管理，使用其异步接口）"""
+
+    def __init__(self, api_key: str, model: str):
+        import google.generativeai as genai
+        self.name = "gemini"
+        self.api_key = api_key
+        self.model_name = model
+        genai.configure(api_key=api_key)
+        self.gemini_model = genai.GenerativeModel(model)
+
+    async def complete(self, messages: list) -> Optional[str]:
+        """发送最新一条用户消息，返回回复文本"""
+        text, _ = await self.complete_with_usage(messages)
+        return text
+
+    async def complete_with_usage(self, messages: list) -> Tuple[Optional[str], Optional[Usage]]:
+        """发送最新一条用户消息，返回回复文本和 token 用量"""
+        response = await self.gemini_model.generate_content_async(messages[-1]["content"])
+        return response.text, parse_gemini_usage(getattr(response, "usage_metadata", None))
+
+    async def probe(self):
+        """需要鉴权的轻量请求（计算 token 数，不产生费用）"""
+        await self.gemini_model.count_tokens_async("ping")
+
+    async def stream(self, messages: list,
+                     on_usage: Optional[Callable[[Usage], None]] = None) -> AsyncIterator[str]:
+        """流式发送最新一条用户消息，逐段返回回复文本"""
+        response = await self.gemini_model.generate_content_async(messages[-1]["content"], stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        if on_usage and getattr(response, "usage_metadata", None):
+            on_usage(parse_gemini_usage(response.usage_metadata))
+
+
+class ProviderRegistry:
+    """模型注册表
+
+    每个后端注册一个构造函数，客户端在首次使用（或后台预热）时才创建，
+    API密钥或模型变化时重新创建；OpenAI 兼容接口共享的连接池同样延迟创建。
+    """
+
+    def __init__(self, config_manager):
+        self.config = config_manager
+        self._builders: Dict[str, Callable[..., object]] = {}
+        self._providers: Dict[str, object] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._http_client = None
+        self._lock = threading.RLock()  # 预热线程和事件循环可能同时创建客户端
+
+    def register(self, name: str, builder: Callable[..., object]):
+        """注册后端：builder(registry, api_key, model, settings) -> 客户端"""
+        self._builders[name] = builder
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._builders)
+
+    @property
+    def http_client(self) -> "httpx.AsyncClient":
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = create_http_client(self.config.get_ai_http_settings())
+            return self._http_client
+
+    def get(self, name: str):
+        """获取模型客户端，API密钥、模型或接口地址变化时才重新创建"""
+        api_key = self.config.get_api_key(name)
+        settings = self.config.config["ai_settings"].get(name, {})
+        model = settings.get("model", DEFAULT_MODELS[name])
+        signature = (api_key, model, self.config.get_base_url(name))
+
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider and self._signatures.get(name) == signature:
+                return provider
+            provider = self._providers[name] = self._builders[name](self, api_key, model, settings)
+            self._signatures[name] = signature
+            return provider
+
+    def loaded(self) -> List[str]:
+        """已创建客户端的模型"""
+        return list(self._providers)
+
+    async def prewarm(self, names: Iterable[str]):
+        """在后台线程中导入 SDK 并创建客户端，避免首次请求时等待"""
+        for name in names:
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                print(f"{name} 预热失败: {e}")
+
+    async def aclose(self):
+        """关闭共享连接池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+
+def _openai_compatible(name: str) -> Callable[..., object]:
+    def build(registry: ProviderRegistry, api_key: str, model: str, settings: dict):
+        params = {"max_tokens": 2000}
+        if "temperature" in settings:
+            params["temperature"] = settings["temperature"]
+        base_url = registry.config.get_base_url(name) or PROVIDER_BASE_URLS[name]
+        return OpenAICompatibleProvider(name, api_key, base_url, model, registry.http_client, **params)
+    return build
+
+
+def create_provider_registry(config_manager) -> ProviderRegistry:
+    """创建包含所有内置模型的注册表"""
+    registry = ProviderRegistry(config_manager)
+    registry.register("deepseek", _openai_compatible("deepseek"))
+    registry.register("gemini", lambda registry, api_key, model, settings: GeminiProvider(api_key, model))
+    registry.register("qianwen", _openai_compatible("qianwen"))
+    return registry
@@ -0,0 +1,238 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from .provider_stats import ProviderStats
+from .retry_policy import Deadline, RequestDeadlineExceeded
+from .token_counter import estimate_tokens
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后熔断，冷却后放行一次试探请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """是否允许发起请求"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            return True
+        # 半开状态下只放行一个试探请求
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class AIRouter:
+    """多模型路由
+
+    按配置的顺序故障转移，每个模型有独立的熔断器；主模型超过其 p95 耗时仍未返回时，
+    向下一个模型发出对冲请求，采用先返回的有效结果并取消其余请求。
+    """
+
+    def __init__(self, call_provider: Callable[[str, list, str, Optional[Deadline]], Awaitable[Optional[str]]],
+                 is_available: Callable[[str], bool], settings: dict, stats: ProviderStats):
+        self.call_provider = call_provider  # call_provider(name, messages, message, deadline)
+        self.is_available = is_available    # 模型是否已配置（有API密钥）
+        self.settings = settings
+        self.stats = stats
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.hedged_count = 0
+        self.hedge_wins = 0
+        self.failover_count = 0
+
+    def update_settings(self, settings: dict):
+        """更新路由配置"""
+        self.settings = settings
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = self.breakers[name] = CircuitBreaker(
+                self.settings.get("breaker_failure_threshold", 3),
+                self.settings.get("breaker_reset_timeout", 30),
+            )
+        return breaker
+
+    def _candidates(self, primary: str, allowed: Optional[List[str]] = None) -> List[str]:
+        """主模型 + 故障转移顺序中已配置且允许的模型（熔断在发起请求时检查）"""
+        order = [primary] + [name for name in self.settings.get("failover_order", []) if name != primary]
+        if not self.settings.get("failover", True):
+            order = [primary]
+        return [name for name in order
+                if self.is_available(name) and (not allowed or name in allowed or name == primary)]
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        """主模型超过该时间仍未返回时发出对冲请求，样本不足时不对冲"""
+        if not self.settings.get("hedge", True):
+            return None
+        if self.stats.sample_count(name) < self.settings.get("hedge_min_samples", 20):
+            return None
+        return max(self.stats.percentile(name, 0.95), self.settings.get("hedge_min_delay", 1.0))
+
+    async def _timed_call(self, name: str, messages: list, message: str,
+                          deadline: Optional[Deadline] = None) -> Optional[str]:
+        """调用单个模型并更新熔断器与耗时统计"""
+        breaker = self.breaker(name)
+        started = time.monotonic()
+        try:
+            result = await self.call_provider(name, messages, message, deadline)
+        except asyncio.CancelledError:
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                # 试探请求被取消（对冲落败），下次重新试探
+                breaker.state = CircuitBreaker.OPEN
+            raise
+        except RequestDeadlineExceeded:
+            breaker.record_failure()
+            self.stats.record_failure(name)
+            raise
+        except Exception as e:
+            print(f"{name} 调用失败: {e}")
+            result = None
+
+        if result:
+            breaker.record_success()
+            self.stats.record_success(name, time.monotonic() - started, estimate_tokens(result))
+        else:
+            breaker.record_failure()
+            self.stats.record_failure(name)
+        return result
+
+    async def complete(self, primary: str, messages: list, message: str,
+                       allowed: Optional[List[str]] = None, deadline: Optional[Deadline] = None) -> Optional[str]:
+        """按路由策略获取回复，所有模型都失败时返回 None；allowed 限制故障转移可用的模型
+
+        截止时间已到或剩余时间不足以重试、且没有模型返回结果时抛出 RequestDeadlineExceeded。
+        """
+        queue = self._candidates(primary, allowed)
+        pending: Dict[asyncio.Task, str] = {}
+        hedged = False
+        timed_out: Optional[RequestDeadlineExceeded] = None
+
+        def launch() -> bool:
+            # 跳过已熔断的模型；截止时间已到时不再发起新请求
+            while queue and not (deadline and deadline.expired):
+                name = queue.pop(0)
+                if self.breaker(name).allow():
+                    pending[asyncio.ensure_future(self._timed_call(name, messages, message, deadline))] = name
+                    return True
+            return False
+
+        if not launch():
+            return None
+        try:
+            while pending:
+                timeout = None
+                if not hedged and queue and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if deadline and deadline.expired:
+                        raise RequestDeadlineExceeded(f"请求超过 {deadline.timeout:g} 秒未完成")
+                    hedged = True
+                    if launch():
+                        self.hedged_count += 1
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except RequestDeadlineExceeded as e:
+                        # 剩余时间仍够时可以转移到下一个模型，都失败后再报告超时
+                        timed_out, result = e, None
+                    if result:
+                        if hedged and name != primary:
+                            self.hedge_wins += 1
+                        return result
+
+                # 已完成的请求都失败了，没有其他进行中的请求时转移到下一个模型
+                if not pending and launch():
+                    self.failover_count += 1
+            if timed_out:
+                raise timed_out
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, primary: str, open_stream: Callable[[str], AsyncIterator[str]],
+                     allowed: Optional[List[str]] = None, deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """按熔断和故障转移顺序流式获取回复（不对冲）
+
+        收到第一段之前失败或没有任何输出时转移到下一个模型；已经输出后出错直接抛出，
+        避免同一条回复混入两个模型的内容。open_stream(name) 返回该模型的文本流。
+        """
+        error: Optional[Exception] = None
+        tried = False
+        for name in self._candidates(primary, allowed):
+            if deadline and deadline.expired:
+                break
+            breaker = self.breaker(name)
+            if not breaker.allow():
+                continue
+            if tried:
+                self.failover_count += 1
+            tried = True
+            iterator = open_stream(name).__aiter__()
+            started = False
+            try:
+                async for delta in iterator:
+                    started = True
+                    yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                if breaker.state == CircuitBreaker.HALF_OPEN:
+                    breaker.state = CircuitBreaker.OPEN
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                if started:
+                    raise
+                print(f"{name} 流式调用失败: {e}")
+                error = e
+                continue
+            finally:
+                await iterator.aclose()
+
+            if started:
+                breaker.record_success()
+                return
+            breaker.record_failure()
+            print(f"{name} 没有返回内容")
+
+        if isinstance(error, RequestDeadlineExceeded):
+            raise error
+        if deadline and deadline.expired:
+            raise RequestDeadlineExceeded(f"请求超过 {deadline.timeout:g} 秒未完成")
+        if error:
+            raise error
+        if not tried:
+            raise RuntimeError(f"没有可用的模型（{primary} 未配置或已熔断）")
+
+    def get_stats(self) -> dict:
+        """获取路由统计"""
+        return {
+            "breakers": {name: breaker.state for name, breaker in self.breakers.items()},
+            "hedged": self.hedged_count,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failover_count,
+        }
@@ -0,0 +1,173 @@
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterator, List, Optional
+from .token_counter import estimate_tokens
+
+
+class Turn:
+    """一条对话消息（__slots__ 省去每条消息的实例字典）"""
+
+    __slots__ = ("role", "content", "tokens", "created")
+
+    def __init__(self, role: str, content: str, tokens: int, created: float):
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = tokens
+        self.created = created  # 加入时间（从数据库恢复的消息为记录时间）
+
+    @property
+    def size(self) -> int:
+        """估算占用的字节数（记录本身 + 文本）"""
+        return _TURN_SIZE + sys.getsizeof(self.content)
+
+
+_TURN_SIZE = sys.getsizeof(Turn("user", "", 0, 0.0)) + sys.getsizeof(0.0)
+
+
+class GroupHistory:
+    """单个群的对话历史
+
+    每条消息的 token 数只在加入时计算一次，并维护总数；
+    超出预算时从最早的消息开始淘汰（deque 头部弹出，O(1)）。
+    """
+
+    __slots__ = ("turns", "total_tokens", "memory", "memory_tokens", "size")
+
+    def __init__(self, memory: str = None):
+        self.turns: Deque[Turn] = deque()
+        self.total_tokens = 0
+        self.memory = None  # 早期对话压缩后的摘要
+        self.memory_tokens = 0
+        self.size = 0  # 消息和摘要占用的字节数估算
+        if memory:
+            self.set_memory(memory)
+
+    def append(self, role: str, content: str, created: float = None):
+        turn = Turn(role, content, estimate_tokens(content), created or time.time())
+        self.turns.append(turn)
+        self.total_tokens += turn.tokens
+        self.size += turn.size
+
+    def _pop_oldest(self) -> Turn:
+        turn = self.turns.popleft()
+        self.total_tokens -= turn.tokens
+        self.size -= turn.size
+        return turn
+
+    def trim(self, budget: int):
+        """淘汰最早的消息直到不超过预算（至少保留最新一条）"""
+        while self.total_tokens + self.memory_tokens > budget and len(self.turns) > 1:
+            self._pop_oldest()
+
+    def set_memory(self, memory: str):
+        if self.memory:
+            self.size -= sys.getsizeof(self.memory)
+        self.memory = memory
+        self.memory_tokens = estimate_tokens(memory)
+        self.size += sys.getsizeof(memory)
+
+    def replace_with_memory(self, compacted: List[Turn], memory: str):
+        """用摘要替换已被压缩的最早几条消息（期间已被淘汰的消息直接跳过）"""
+        for turn in compacted:
+            if self.turns and self.turns[0] is turn:
+                self._pop_oldest()
+        self.set_memory(memory)
+
+    def clear(self):
+        self.turns.clear()
+        self.total_tokens = 0
+        self.memory = None
+        self.memory_tokens = 0
+        self.size = 0
+
+    def messages(self, system_message: dict) -> List[dict]:
+        """转换为接口所需的消息列表（共享的系统提示词消息和摘要在最前）"""
+        result = [system_message]
+        if self.memory:
+            result.append({"role": "system", "content": f"此前对话摘要：{self.memory}"})
+        result.extend({"role": turn.role, "content": turn.content} for turn in self.turns)
+        return result
+
+    def __len__(self):
+        return len(self.turns)
+
+
+class HistoryStore:
+    """所有群的对话历史
+
+    按最近使用顺序保存，群数量或内存估算超过上限时淘汰最久未使用的群；
+    被淘汰的群下次访问时会从数据库重新恢复。有请求正在处理的群被固定，不会被淘汰。
+    """
+
+    def __init__(self, max_groups: int = 200, max_memory_mb: float = 64):
+        self.max_groups = max_groups
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._groups: "OrderedDict[str, GroupHistory]" = OrderedDict()
+        self._pinned: Dict[str, int] = {}
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "HistoryStore":
+        return cls(settings["max_groups"], settings["max_memory_mb"])
+
+    def update_limits(self, settings: dict):
+        self.max_groups = settings["max_groups"]
+        self.max_bytes = int(settings["max_memory_mb"] * 1024 * 1024)
+
+    def get(self, group_name: str) -> Optional[GroupHistory]:
+        """获取群的历史并标记为最近使用"""
+        history = self._groups.get(group_name)
+        if history is not None:
+            self._groups.move_to_end(group_name)
+        return history
+
+    def create(self, group_name: str, memory: str = None) -> GroupHistory:
+        history = self._groups[group_name] = GroupHistory(memory)
+        self._groups.move_to_end(group_name)
+        self.enforce_limits()
+        return history
+
+    def pop(self, group_name: str) -> Optional[GroupHistory]:
+        return self._groups.pop(group_name, None)
+
+    def pin(self, group_name: str):
+        """请求开始时固定群的历史（可重入），避免请求期间被其他群挤出"""
+        self._pinned[group_name] = self._pinned.get(group_name, 0) + 1
+
+    def unpin(self, group_name: str):
+        count = self._pinned.get(group_name, 0) - 1
+        if count > 0:
+            self._pinned[group_name] = count
+        else:
+            self._pinned.pop(group_name, None)
+
+    def enforce_limits(self):
+        """淘汰最久未使用且未固定的群直到不超过上限（至少保留最近使用的一个）"""
+        for group_name in list(self._groups)[:-1]:
+            if len(self._groups) <= self.max_groups and self.memory_bytes() <= self.max_bytes:
+                break
+            if group_name in self._pinned:
+                continue
+            del self._groups[group_name]
+            self.evictions += 1
+
+    def memory_bytes(self) -> int:
+        return sum(history.size for history in self._groups.values())
+
+    def memory_usage(self) -> Dict[str, dict]:
+        """每个群的消息数、token 数和内存估算"""
+        return {
+            name: {"turns": len(history), "tokens": history.total_tokens + history.memory_tokens,
+                   "bytes": history.size}
+            for name, history in self._groups.items()
+        }
+
+    def __contains__(self, group_name: str) -> bool:
+        return group_name in self._groups
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._groups)
+
+    def __len__(self):
+        return len(self._groups)
@@ -1,39 +1,71 @@
-from wxauto import WeChat
 import asyncio
-from typing import List, Optional, NamedTuple
-import time
-import re
+from typing import List, Optional
 import traceback
-from concurrent.futures import ThreadPoolExecutor
-import threading
-
-class Message(NamedTuple):
-    """消息数据类"""
-    sender: str
-    content: str
-    room_id: str
+from .message_ingestor import Message, MessageIngestor
+from .poll_scheduler import PollScheduler
+from .message_dedup import MessageDeduplicator
+from .group_resolver import GroupResolver
+from .message_dispatcher import MessageDispatcher
+from .trigger_matcher import TriggerEngine
+from .wechat_transport import create_transport_factory
+from .outbound_sender import OutboundSender
+from .reply_chunker import SentenceChunker
+from .response_cache import normalize_question
 
 class ChatManager:
-    def __init__(self, config_manager, ai_manager, db_manager):
+    def __init__(self, config_manager, ai_manager, db_manager, transport_factory=None):
         self.config = config_manager
         self.ai = ai_manager
         self.db = db_manager
-        self.wx = WeChat()  # 直接初始化 WeChat 实例
-        self.running = False
+        # 微信传输层实例由采集线程创建并独占，所有微信调用都通过 _wx_call 转发
+        if transport_factory is None:
+            transport_factory = create_transport_factory(self.config.get_transport_settings())
         self.groups = set(self.config.get_groups())  # 从配置中加载群组
+        self.resolver = GroupResolver(self.groups)  # 聊天窗口 -> 群组 的精确索引
+        self.scheduler = PollScheduler.from_settings(self.config.get_polling_settings())
+        self.ingestor = MessageIngestor(transport_factory, self.resolver.resolve, self.scheduler)
+        self.inbox: Optional[asyncio.Queue] = None
+        self.running = False
         self._task = None
         self.main_window = None
-        self.last_messages = {group: set() for group in self.groups}  # 为每个群初始化消息集合
+        self.dedup = MessageDeduplicator()  # 每个群的已处理消息指纹
+        self.triggers = TriggerEngine(self.config)  # 预编译的触发词匹配
+        dispatch_settings = self.config.get_dispatch_settings()
+        self.dispatcher = MessageDispatcher(self.handle_message, dispatch_settings["max_concurrency"],
+                                            self._coalesce_key)
+        self.sender = OutboundSender.from_settings(self._send_now, self.config.get_outbound_settings())
+
+    def _ensure_ingestor(self):
+        """确保采集线程已启动（需在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        if self.inbox is None:
+            self.inbox = asyncio.Queue()
+        self.ingestor.ensure_started(loop, self.inbox)
+
+    async def _wx_call(self, func, *args, **kwargs):
+        """在采集线程中执行微信调用，不阻塞事件循环"""
+        self._ensure_ingestor()
+        return await asyncio.wrap_future(self.ingestor.submit(func, *args, **kwargs))
+
+    def _send_now(self, group_name: str, text: str):
+        """由发送线程调用：在采集线程中执行 SendMsg 并等待完成"""
+        self.ingestor.submit(lambda wx: wx.SendMsg(text, group_name)).result()
+
+    def send_message(self, group_name: str, text: str):
+        """把消息交给出站队列，由发送线程限速发送"""
+        self.sender.start()
+        return self.sender.enqueue(group_name, text)
 
     async def add_group(self, group_name: str) -> bool:
         """添加监听群组"""
         try:
             if group_name not in self.groups:
-                # 直接添加群组
-                self.wx.AddListenChat(who=group_name, savepic=False)
+                # 在采集线程中添加监听
+                await self._wx_call(lambda wx: wx.AddListenChat(who=group_name, savepic=False))
                 
                 self.groups.add(group_name)
-                self.last_messages[group_name] = set()  # 初始化消息集合
+                self.resolver.add(group_name)
+                self.dedup.forget(group_name)  # 重置消息指纹
                 
                 # 保存配置
                 groups = list(self.groups)
@@ -46,8 +78,8 @@ class ChatManager:
             # 清理失败的添加
             if group_name in self.groups:
                 self.groups.remove(group_name)
-            if group_name in self.last_messages:
-                del self.last_messages[group_name]
+            self.resolver.remove(group_name)
+            self.dedup.forget(group_name)
             return False
 
     async def start(self) -> bool:
@@ -56,16 +88,22 @@ class ChatManager:
             return False
         
         try:
-            print("微信登录账号:", self.wx.nickname)
+            print("微信登录账号:", await self._wx_call(lambda wx: wx.nickname))
             
             # 初始化监听
-            for group in self.groups:
-                self.wx.AddListenChat(who=group, savepic=False)
-                if group not in self.last_messages:
-                    self.last_messages[group] = set()
+            self.resolver.rebuild(self.groups)
+            for group in list(self.groups):
+                await self._wx_call(lambda wx, who=group: wx.AddListenChat(who=who, savepic=False))
                 print(f"已开始监听微信群: {group}")
             
+            # 丢弃上次运行残留的消息
+            while not self.inbox.empty():
+                self.inbox.get_nowait()
+
             self.running = True
+            self.ingestor.start_polling()
+            # 后台预热模型连接并探测API密钥，不阻塞启动
+            self.ai.start_health_checks(self._on_provider_health)
             return True
         except Exception as e:
             print(f"启动失败: {e}")
@@ -77,19 +115,22 @@ class ChatManager:
         try:
             print("正在停止聊天管理器...")
             self.running = False
+            self.ingestor.stop_polling()
+            self.ai.stop_health_checks()
             
             # 取消异步任务
             if self._task:
                 self._task.cancel()
                 self._task = None
+            self.dispatcher.cancel_all()
             
             # 清理消息记录
-            self.last_messages.clear()
+            self.dedup.clear()
             
-            # 移除所有监听
+            # 移除所有监听（在采集线程中执行，不等待结果）
             for group in self.groups:
                 try:
-                    self.wx.RemoveListenChat(group)
+                    self.ingestor.submit(lambda wx, who=group: wx.RemoveListenChat(who))
                 except:
                     pass
             
@@ -102,82 +143,52 @@ class ChatManager:
         """清理资源"""
         try:
             self.stop()
+            self.sender.stop()
+            self.ingestor.stop()
             self.groups.clear()
-            self.last_messages.clear()
+            self.resolver.rebuild(())
+            self.dedup.clear()
         except Exception as e:
             print(f"清理资源时发生错误: {e}")
 
     async def process_messages(self):
-        """处理消息的主循环"""
+        """处理消息的主循环（只消费采集线程投递的消息）"""
         try:
+            self._ensure_ingestor()
+            self._task = asyncio.current_task()
             while self.running:
-                try:
-                    # 获取所有监听消息
-                    msgs = self.wx.GetListenMessage()
-                    if msgs:
-                        for chat in msgs:
-                            group_name = next((group for group in self.groups if group in str(chat)), None)
-                            if not group_name:
-                                continue
-
-                            one_msgs = msgs.get(chat)
-                            for msg_data in one_msgs:
-                                try:
-                                    # 生成消息唯一标识
-                                    msg_id = f"{msg_data.sender}_{msg_data.content}_{time.time()}"
-                                    
-                                    # 检查是否是新消息
-                                    if msg_id in self.last_messages[group_name]:
-                                        continue
-                                        
-                                    # 添加到已处理集合
-                                    self.last_messages[group_name].add(msg_id)
-                                    # 保持集合大小在合理范围
-                                    if len(self.last_messages[group_name]) > 100:
-                                        self.last_messages[group_name] = set(list(self.last_messages[group_name])[-50:])
-
-                                    # 跳过自己发送的消息
-                                    if msg_data.sender == 'Self':
-                                        continue
-
-                                    # 创建消息对象
-                                    msg = Message(
-                                        sender=msg_data.sender,
-                                        content=msg_data.content,
-                                        room_id=group_name
-                                    )
-                                    
-                                    # 处理消息
-                                    await self.handle_message(msg, group_name)
-
-                                except Exception as e:
-                                    print(f"处理单条消息错误: {e}")
-                                    traceback.print_exc()
+                item = await self.inbox.get()
 
-                except Exception as e:
-                    error_msg = str(e)
-                    print(f"消息处理循环错误: {error_msg}")
-                    
-                    # 检查是否是微信窗口关闭错误
-                    if "事件无法调用任何订户" in error_msg or "-2147220991" in error_msg:
-                        print("检测到微信窗口已关闭，停止监听...")
-                        if self.main_window:
-                            self.main_window.add_message("系统", "检测到微信窗口已关闭，已停止监听", True)
-                            # 在主线程中更新UI
-                            await asyncio.get_event_loop().run_in_executor(
-                                None, 
-                                self.main_window.update_service_status,
-                                False
-                            )
-                        self.running = False
-                        break
-
-                    # 其他错误，等待一段时间后继续
-                    await asyncio.sleep(5)
+                if isinstance(item, Exception):
+                    # 采集线程检测到微信窗口已关闭
+                    print("检测到微信窗口已关闭，停止监听...")
+                    if self.main_window:
+                        self.main_window.add_message("系统", "检测到微信窗口已关闭，已停止监听", True)
+                        self.main_window.update_service_status(False)
+                    self.running = False
+                    self.ingestor.stop_polling()
+                    break
+
+                msg_data = item
+                group_name = msg_data.room_id
+                if group_name not in self.groups:
                     continue
 
-                # 正常等待时间
-                await asyncio.sleep(2)
+                try:
+                    # 跳过 wxauto 重复投递的消息
+                    if self.dedup.is_duplicate(group_name, msg_data):
+                        continue
+
+                    # 跳过自己发送的消息
+                    if msg_data.sender == 'Self':
+                        continue
+
+                    # 交给对应群组的工作协程处理，不阻塞其他群
+                    self.dispatcher.dispatch(msg_data, group_name)
+
+                except Exception as e:
+                    print(f"处理单条消息错误: {e}")
+                    traceback.print_exc()
 
         except asyncio.CancelledError:
             print("消息处理任务被取消")
@@ -198,40 +209,24 @@ class ChatManager:
                 except:
                     pass
 
-    async def handle_message(self, msg, group_name: str):
-        """处理单条消息"""
+    def _coalesce_key(self, msg, group_name: str) -> Optional[str]:
+        """触发消息的归一化问题，本群已在排队或处理中的相同问题只回复一次"""
+        if not self.config.get_single_flight_settings()["enabled"]:
+            return None
+        if msg.sender == "SYS" or "以下为新消息" in msg.content:
+            return None
+        content = self.triggers.match(group_name, msg.content)
+        return normalize_question(content) if content else None
+
+    async def handle_message(self, msg, group_name: str, followers=()):
+        """处理单条消息，followers 为合并到这条消息的相同问题"""
         try:
             # 跳过系统消息
             if msg.sender == "SYS" or "以下为新消息" in msg.content:
                 return
 
-            # 获取自定义触发词和默认触发词
-            custom_trigger = self.config.get_trigger_word()
-            default_triggers = ['victorAI', '@victorAI']
-            
-            # 检查是否包含触发词
-            has_trigger = (
-                f'@{custom_trigger}' in msg.content or 
-                msg.content.lower().startswith(custom_trigger.lower()) or 
-                '@victorAI' in msg.content or 
-                msg.content.lower().startswith('victorai')
-            )
-            
-            if not has_trigger:
-                return
-            
-            # 提取实际的消息内容，移除所有可能的触发词
-            content = msg.content
-            # 移除自定义触发词（区分大小写）
-            content = content.replace(f'@{custom_trigger}', '').replace(custom_trigger, '')
-            # 移除默认触发词（不区分大小写）
-            for trigger in default_triggers:
-                pattern = re.compile(re.escape(trigger), re.IGNORECASE)
-                content = pattern.sub('', content)
-            
-            # 清理并去除首尾空格
-            content = content.strip()
-            
+            # 一次扫描完成触发词检测和移除（自定义、默认及群组触发词）
+            content = self.triggers.match(group_name, msg.content)
             if not content:
                 return
 
@@ -243,19 +238,25 @@ class ChatManager:
 
             # 获取AI回复
             model = self.config.config["default_model"]
-            reply = await self.ai.get_ai_response(content, group_name, model)
+            streaming = self.config.get_streaming_settings()
+            if streaming["enabled"]:
+                # 流式回复：每凑满一句/一段就发送，完整内容用于显示和存储
+                reply = await self._stream_reply(content, group_name, model, streaming)
+            else:
+                reply = await self.ai.get_ai_response(content, group_name, model)
+                if reply:
+                    # 发送回复
+                    self.send_message(group_name, reply)
 
             if reply:
-                # 发送回复
-                self.wx.SendMsg(reply, group_name)
                 print(f"已回复 - 群: {group_name}, 内容: {reply}")
                 
                 # 显示回复消息
                 if self.main_window:
                     self.main_window.add_message("AI助手", reply, True)
 
-                # 保存到数据库
-                self.db.add_message(
+                # 保存到数据库（后台写入）
+                self.db.add_message_async(
                     sender_id=msg.sender,
                     sender_name=msg.sender,
                     group_name=group_name,
@@ -263,23 +264,49 @@ class ChatManager:
                     reply=reply,
                     model=model
                 )
+                if followers:
+                    print(f"相同问题合并回复 - 群: {group_name}, 共 {len(followers)} 条")
+                for follower in followers:
+                    # 同一个回复在群里已发送，只保存记录；标记后不会重复恢复到对话历史
+                    self.db.add_message_async(
+                        sender_id=follower.sender,
+                        sender_name=follower.sender,
+                        group_name=group_name,
+                        message=self.triggers.match(group_name, follower.content) or content,
+                        reply=reply,
+                        model=model,
+                        mark="coalesced"
+                    )
 
         except Exception as e:
             print(f"消息处理失败: {e}")
             error_msg = f"消息处理出错: {str(e)}"
-            self.wx.SendMsg(error_msg, group_name)
+            self.send_message(group_name, error_msg)
             if self.main_window:
                 self.main_window.add_message("系统", error_msg, True)
 
+    async def _stream_reply(self, content: str, group_name: str, model: str, settings: dict) -> str:
+        """流式获取AI回复并按句子逐条发送，返回完整回复"""
+        chunker = SentenceChunker(settings["min_chunk_chars"], settings["max_chunk_chars"])
+        parts = []
+        async for delta in self.ai.stream_ai_response(content, group_name, model):
+            parts.append(delta)
+            for chunk in chunker.feed(delta):
+                self.send_message(group_name, chunk)
+        for chunk in chunker.flush():
+            self.send_message(group_name, chunk)
+        return "".join(parts).strip()
+
     def remove_group(self, group_name: str) -> bool:
         """移除监听群组"""
         try:
             if group_name in self.groups:
                 # 从监听列表移除
                 self.groups.remove(group_name)
+                self.resolver.remove(group_name)
                 # 清理消息记录
-                if group_name in self.last_messages:
-                    del self.last_messages[group_name]
+                self.dedup.forget(group_name)
+                self.triggers.forget(group_name)
                 # 保存配置
                 groups = list(self.groups)
                 self.config.set_groups(groups)
@@ -294,6 +321,23 @@ class ChatManager:
         """获取当前监听的群组列表"""
         return list(self.groups)
 
+    def get_polling_stats(self) -> dict:
+        """获取轮询调度统计（当前间隔、轮询次数等）"""
+        return self.scheduler.get_stats()
+
+    def get_dispatch_stats(self) -> dict:
+        """获取消息分发统计"""
+        return self.dispatcher.get_stats()
+
+    def get_outbound_stats(self) -> dict:
+        """获取出站队列统计（队列深度、发送延迟）"""
+        return self.sender.get_stats()
+
+    def _on_provider_health(self, health: dict):
+        """模型连接状态变化时更新界面"""
+        if self.main_window:
+            self.main_window.update_provider_status(health)
+
     def set_main_window(self, window):
         """设置主窗口引用"""
         self.main_window = window 
\ No newline at end of file
@@ -24,18 +24,30 @@ class ConfigManager:
             "ai_settings": {
                 "deepseek": {
                     "api_key": os.getenv("DEEPSEEK_API_KEY", ""),
+                    "base_url": os.getenv("DEEPSEEK_BASE_URL", ""),
                     "model": "deepseek-chat",
-                    "temperature": 0.7
+                    "temperature": 0.7,
+                    "history_token_budget": 6000
                 },
                 "gemini": {
                     "api_key": os.getenv("GEMINI_API_KEY", ""),
-                    "model": "gemini-1.5-flash"
+                    "model": "gemini-1.5-flash",
+                    "history_token_budget": 8000
                 },
                 "qianwen": {
                     "api_key": os.getenv("QIANWEN_API_KEY", ""),
-                    "model": "qwen-turbo"
+                    "base_url": os.getenv("QIANWEN_BASE_URL", ""),
+                    "model": "qwen-turbo",
+                    "history_token_budget": 4000
                 }
             },
+            "ai_http": {
+                "max_connections": 20,
+                "max_keepalive_connections": 10,
+                "keepalive_expiry": 60,
+                "connect_timeout": 10,
+                "read_timeout": 60
+            },
             "proxy": {
                 "http": os.getenv("HTTP_PROXY", ""),
                 "https": os.getenv("HTTPS_PROXY", "")
@@ -44,6 +56,98 @@ class ConfigManager:
             "groups": [],
             "default_model": "deepseek",
             "trigger_word": "AI",
+            "group_triggers": {},
+            "polling": {
+                "min_interval": 0.1,
+                "max_interval": 2.0,
+                "decay": 1.5,
+                "error_backoff": 1.0,
+                "max_error_backoff": 30.0
+            },
+            "dispatch": {
+                "max_concurrency": 4
+            },
+            "response_cache": {
+                "enabled": True,
+                "ttl_seconds": 21600,
+                "memory_entries": 512,
+                "db_entries": 20000,
+                "group_scope": False,
+                # 只有常见问题会缓存：这些问题和无状态群里的问题不带对话历史单独回答
+                "faq_questions": [],
+                "stateless_groups": []
+            },
+            "routing": {
+                "failover": True,
+                "failover_order": ["deepseek", "qianwen", "gemini"],
+                "hedge": True,
+                "hedge_min_samples": 20,
+                "hedge_min_delay": 1.0,
+                "breaker_failure_threshold": 3,
+                "breaker_reset_timeout": 30,
+                "model_allowlists": {}
+            },
+            "pricing": {
+                "currency": "CNY",
+                # 每百万 token 的价格：输入（未命中缓存）、命中缓存的输入、输出
+                "models": {
+                    "deepseek-chat": {"input": 2.0, "cached_input": 0.5, "output": 8.0},
+                    "qwen-turbo": {"input": 0.3, "cached_input": 0.3, "output": 0.6},
+                    "gemini-1.5-flash": {"input": 0.55, "cached_input": 0.14, "output": 2.2}
+                }
+            },
+            "health": {
+                "enabled": True,
+                "keepalive_interval": 45,
+                "probe_timeout": 10
+            },
+            "retry": {
+                "deadline_seconds": 45,
+                "max_attempts": 3,
+                "base_delay": 0.5,
+                "max_delay": 8.0
+            },
+            "single_flight": {
+                "enabled": True,
+                "group_scope": False
+            },
+            "db_writer": {
+                "batch_size": 200,
+                "flush_interval_ms": 500,
+                "max_queue": 10000
+            },
+            "history_store": {
+                "hydrate_limit": 50,
+                "max_groups": 200,
+                "max_memory_mb": 64
+            },
+            "history_compaction": {
+                "enabled": True,
+                "model": "qianwen",
+                "trigger_ratio": 0.75,
+                "keep_recent_turns": 6
+            },
+            "streaming": {
+                "enabled": False,
+                "min_chunk_chars": 20,
+                "max_chunk_chars": 500
+            },
+            "outbound": {
+                "group_rate": 1.0,
+                "group_burst": 3,
+                "global_rate": 2.0,
+                "global_burst": 5,
+                "coalesce_max_chars": 2000
+            },
+            "transport": {
+                "backend": "wxauto",
+                "simulation": {
+                    "rate": 0.5,
+                    "trigger_ratio": 0.2,
+                    "burstiness": 0.0,
+                    "burst_size": 5
+                }
+            },
             "window_settings": {
                 "always_on_top": True,
                 "position": {"x": 0, "y": 0}
@@ -82,6 +186,25 @@ class ConfigManager:
             self.config["ai_settings"][model]["api_key"] = api_key
             self.save_config()
 
+    def get_base_url(self, model) -> str:
+        """获取模型接口地址，为空时使用内置地址（可指向本地模拟服务）"""
+        return self.config["ai_settings"].get(model, {}).get("base_url", "")
+
+    def set_base_url(self, model, base_url):
+        """设置模型接口地址"""
+        if model in self.config["ai_settings"]:
+            self.config["ai_settings"][model]["base_url"] = base_url
+            self.save_config()
+
+    def get_ai_http_settings(self) -> dict:
+        """获取AI接口连接池设置（连接数、超时）"""
+        return self._get_section("ai_http")
+
+    def get_history_token_budget(self, model: str) -> int:
+        """获取模型的对话历史 token 预算（含系统提示词）"""
+        default = self.default_config["ai_settings"].get(model, {}).get("history_token_budget", 4000)
+        return self.config["ai_settings"].get(model, {}).get("history_token_budget", default)
+
     def get_proxy(self):
         """获取代理设置"""
         return self.config["proxy"]
@@ -119,6 +242,87 @@ class ConfigManager:
         self.config["window_settings"] = settings
         self.save_config()
 
+    def _get_section(self, name: str) -> dict:
+        """获取配置段，缺失的键使用默认值补齐"""
+        section = dict(self.default_config.get(name, {}))
+        section.update(self.config.get(name, {}))
+        return section
+
+    def get_polling_settings(self) -> dict:
+        """获取消息轮询设置"""
+        return self._get_section("polling")
+
+    def set_polling_settings(self, settings: dict):
+        """设置消息轮询参数"""
+        self.config["polling"] = {**self.get_polling_settings(), **settings}
+        self.save_config()
+
+    def get_dispatch_settings(self) -> dict:
+        """获取消息分发设置"""
+        return self._get_section("dispatch")
+
+    def set_max_concurrency(self, max_concurrency: int):
+        """设置同时处理的最大消息数"""
+        self.config["dispatch"] = {**self.get_dispatch_settings(), "max_concurrency": max_concurrency}
+        self.save_config()
+
+    def get_response_cache_settings(self) -> dict:
+        """获取AI回复缓存设置"""
+        return self._get_section("response_cache")
+
+    def get_routing_settings(self) -> dict:
+        """获取多模型故障转移、对冲请求和熔断设置"""
+        return self._get_section("routing")
+
+    def get_model_allowlist(self, group_name: str) -> list:
+        """获取群组允许使用的模型，空列表表示不限制"""
+        return self.get_routing_settings()["model_allowlists"].get(group_name, [])
+
+    def get_model_pricing(self, model_name: str) -> dict:
+        """获取模型每百万 token 的价格，未配置时返回空字典"""
+        return self._get_section("pricing")["models"].get(model_name, {})
+
+    def get_health_settings(self) -> dict:
+        """获取模型连接预热和探测设置"""
+        return self._get_section("health")
+
+    def get_retry_settings(self) -> dict:
+        """获取单次请求的截止时间和重试设置"""
+        return self._get_section("retry")
+
+    def get_single_flight_settings(self) -> dict:
+        """获取相同问题并发请求合并设置"""
+        return self._get_section("single_flight")
+
+    def get_db_writer_settings(self) -> dict:
+        """获取聊天记录批量写入设置"""
+        return self._get_section("db_writer")
+
+    def get_history_store_settings(self) -> dict:
+        """获取对话历史持久化设置"""
+        return self._get_section("history_store")
+
+    def get_history_compaction_settings(self) -> dict:
+        """获取历史对话摘要压缩设置"""
+        return self._get_section("history_compaction")
+
+    def get_streaming_settings(self) -> dict:
+        """获取流式回复设置"""
+        return self._get_section("streaming")
+
+    def set_streaming_enabled(self, enabled: bool):
+        """开启或关闭流式回复"""
+        self.config["streaming"] = {**self.get_streaming_settings(), "enabled": enabled}
+        self.save_config()
+
+    def get_outbound_settings(self) -> dict:
+        """获取出站消息限速设置"""
+        return self._get_section("outbound")
+
+    def get_transport_settings(self) -> dict:
+        """获取微信传输层设置（wxauto 或 simulated）"""
+        return self._get_section("transport")
+
     def get_trigger_word(self):
         """获取触发词"""
         return self.config.get("trigger_word", "AI")
@@ -126,4 +330,17 @@ class ConfigManager:
     def set_trigger_word(self, word):
         """设置触发词"""
         self.config["trigger_word"] = word
+        self.save_config()
+
+    def get_group_triggers(self, group_name: str) -> list:
+        """获取群组额外的触发词"""
+        return self.config.get("group_triggers", {}).get(group_name, [])
+
+    def set_group_triggers(self, group_name: str, words: list):
+        """设置群组额外的触发词"""
+        group_triggers = self.config.setdefault("group_triggers", {})
+        if words:
+            group_triggers[group_name] = list(words)
+        else:
+            group_triggers.pop(group_name, None)
         self.save_config() 
\ No newline at end of file
@@ -1,34 +1,106 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import threading
+from .db_writer import BatchWriter
+
+# 每个连接建立时设置：WAL 让读写互不阻塞，NORMAL 在 WAL 下只在检查点时 fsync
+SQLITE_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size_mb": 256,
+    "cache_size_mb": 64,
+    "busy_timeout_ms": 5000,
+    "temp_store": "MEMORY",
+}
+
+# 轻量迁移：已有数据库也会补上这些索引
+SQLITE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_group_created ON chat_messages (group_name, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_sender_created ON chat_messages (sender_id, created_at)",
+)
+
+
+def sqlite_pragmas(profile: dict) -> list:
+    """把存储配置转换为 PRAGMA 语句"""
+    return [
+        f"PRAGMA journal_mode={profile['journal_mode']}",
+        f"PRAGMA synchronous={profile['synchronous']}",
+        f"PRAGMA mmap_size={int(profile['mmap_size_mb'] * 1024 * 1024)}",
+        f"PRAGMA cache_size={-int(profile['cache_size_mb'] * 1024)}",  # 负数表示 KiB
+        f"PRAGMA busy_timeout={int(profile['busy_timeout_ms'])}",
+        f"PRAGMA temp_store={profile['temp_store']}",
+    ]
+
+
+def configure_sqlite(engine, profile: dict = None):
+    """在每个新连接上应用存储配置"""
+    from sqlalchemy import event
+    pragmas = sqlite_pragmas({**SQLITE_PROFILE, **(profile or {})})
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, "connect", on_connect)
 
-Base = declarative_base()
-
-class ChatMessage(Base):
-    __tablename__ = 'chat_messages'
-    
-    id = Column(Integer, primary_key=True)
-    sender_id = Column(String(100))
-    sender_name = Column(String(100))
-    group_name = Column(String(100))
-    message = Column(Text)
-    reply = Column(Text)
-    model = Column(String(100))
-    mark = Column(String(100))
-    created_at = Column(DateTime, default=datetime.now)
 
 class DatabaseManager:
-    def __init__(self):
-        db_path = os.path.join('data', 'chat_history.db')
-        os.makedirs('data', exist_ok=True)
-        self.engine = create_engine(f'sqlite:///{db_path}')
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
-
-    def add_message(self, sender_id, sender_name, group_name, message, reply, model, mark=""):
+    def __init__(self, writer_settings: dict = None, sqlite_profile: dict = None,
+                 db_path: str = os.path.join('data', 'chat_history.db')):
+        self.db_path = db_path
+        self.sqlite_profile = sqlite_profile
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # 首次访问数据库时才导入 SQLAlchemy 并创建连接，不拖慢启动
+        self.engine = None
+        self._session_factory = None
+        self._init_lock = threading.Lock()
+        # 聊天记录和调用记录由后台线程批量写入，不阻塞事件循环
+        if writer_settings:
+            self.writer = BatchWriter.from_settings(self._write_batch, writer_settings)
+        else:
+            self.writer = BatchWriter(self._write_batch)
+
+    def _connect(self):
+        """创建数据库连接并建表（只执行一次）"""
+        with self._init_lock:
+            if self._session_factory is not None:
+                return
+            from sqlalchemy import create_engine
+            from sqlalchemy.orm import sessionmaker
+            from .db_models import Base
+            engine = create_engine(f'sqlite:///{self.db_path}')
+            configure_sqlite(engine, self.sqlite_profile)
+            Base.metadata.create_all(engine)
+            self._migrate(engine)
+            self.engine = engine
+            self._session_factory = sessionmaker(bind=engine)
+
+    def Session(self):
+        """创建数据库会话"""
+        if self._session_factory is None:
+            self._connect()
+        return self._session_factory()
+
+    def prewarm(self):
+        """提前建立连接（在后台线程中调用）"""
+        self._connect()
+
+    def _migrate(self, engine):
+        """为已有数据库补充索引和新增的列"""
+        with engine.begin() as conn:
+            for statement in SQLITE_INDEXES:
+                conn.exec_driver_sql(statement)
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(group_memories)")}
+            if "covered_until" not in columns:
+                conn.exec_driver_sql("ALTER TABLE group_memories ADD COLUMN covered_until DATETIME")
+
+    def add_message(self, sender_id, sender_name, group_name, message, reply, model, mark="", created_at=None):
         """添加新的聊天记录"""
+        from .db_models import ChatMessage
         session = self.Session()
         try:
             chat_message = ChatMessage(
@@ -38,7 +110,8 @@ class DatabaseManager:
                 message=message,
                 reply=reply,
                 model=model,
-                mark=mark
+                mark=mark,
+                created_at=created_at or datetime.now()
             )
             session.add(chat_message)
             session.commit()
@@ -50,8 +123,140 @@ class DatabaseManager:
         finally:
             session.close()
 
+    def add_message_async(self, **kwargs) -> bool:
+        """放入写入队列，由后台线程批量保存聊天记录"""
+        # 记录时间取放入队列的时刻而不是实际写入的时刻，保证与对话历史中的先后顺序一致
+        kwargs.setdefault("created_at", datetime.now())
+        return self.writer.submit(("message", kwargs))
+
+    def _write_batch(self, items):
+        """在一个事务中写入一批记录，失败时逐条重试以免一条坏记录拖累整批，返回成功写入的条数"""
+        from .db_models import AICall, ChatMessage
+        models = {"message": ChatMessage, "ai_call": AICall}
+        session = self.Session()
+        try:
+            session.add_all([models[kind](**fields) for kind, fields in items])
+            session.commit()
+            return len(items)
+        except Exception as e:
+            session.rollback()
+            if len(items) == 1:
+                print(f"保存记录失败: {e}")
+                return 0
+        finally:
+            session.close()
+        return sum(self._write_batch([item]) for item in items)
+
+    def load_group_history(self, group_name, limit=50):
+        """获取群组的对话摘要和摘要之后最近的问答记录（按时间正序，含记录时间）"""
+        from sqlalchemy import or_
+        from .db_models import ChatMessage, GroupMemory
+        session = self.Session()
+        try:
+            memory = session.get(GroupMemory, group_name)
+            query = (session.query(ChatMessage.message, ChatMessage.reply, ChatMessage.created_at)
+                     .filter(ChatMessage.group_name == group_name)
+                     .filter(or_(ChatMessage.mark.is_(None), ChatMessage.mark != "coalesced")))
+            if memory and memory.covered_until:
+                # 已合并进摘要的记录不再重复加载
+                query = query.filter(ChatMessage.created_at >= memory.covered_until)
+            rows = query.order_by(ChatMessage.created_at.desc()).limit(limit).all()
+            return (memory.summary if memory else None), [tuple(row) for row in reversed(rows)]
+        finally:
+            session.close()
+
+    def add_ai_call(self, **fields):
+        """保存一次模型调用的用量记录"""
+        from .db_models import AICall
+        session = self.Session()
+        try:
+            session.add(AICall(**fields))
+            session.commit()
+            return True
+        except Exception as e:
+            print(f"保存调用记录失败: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def add_ai_call_async(self, **fields) -> bool:
+        """放入写入队列，由后台线程批量保存调用记录"""
+        return self.writer.submit(("ai_call", fields))
+
+    def get_writer_stats(self) -> dict:
+        """写入队列深度和刷新耗时"""
+        return self.writer.stats()
+
+    def get_usage_rollup(self, group_name=None, days=7):
+        """按天、按群汇总调用次数、token 用量、缓存命中率、平均耗时和费用"""
+        from sqlalchemy import case, distinct, func
+        from .db_models import AICall
+        session = self.Session()
+        try:
+            day = func.date(AICall.created_at).label("day")
+            cost = func.sum(AICall.cost).label("cost")
+            query = session.query(
+                day, AICall.group_name,
+                func.count(AICall.id),
+                func.sum(case((AICall.outcome != "ok", 1), else_=0)),
+                func.sum(AICall.prompt_tokens),
+                func.sum(AICall.completion_tokens),
+                func.sum(AICall.cached_tokens),
+                func.avg(AICall.latency),
+                func.count(distinct(AICall.prefix_hash)),
+                cost,
+            ).filter(AICall.created_at >= datetime.now() - timedelta(days=days))
+            if group_name:
+                query = query.filter(AICall.group_name == group_name)
+            rows = query.group_by(day, AICall.group_name).order_by(day.desc(), cost.desc()).all()
+            return [{
+                "day": row[0],
+                "group_name": row[1],
+                "calls": row[2],
+                "failures": row[3] or 0,
+                "prompt_tokens": row[4] or 0,
+                "completion_tokens": row[5] or 0,
+                "cached_tokens": row[6] or 0,
+                "cache_hit_rate": (row[6] or 0) / row[4] if row[4] else 0.0,
+                "avg_latency": row[7],
+                "prefixes": row[8],  # 不同前缀的数量，越少越容易命中缓存
+                "cost": row[9] or 0.0,
+            } for row in rows]
+        finally:
+            session.close()
+
+    def get_prefix_stats(self, group_name=None, days=1):
+        """按前缀指纹统计调用次数和缓存命中率，用于判断前缀是否稳定"""
+        from sqlalchemy import func
+        from .db_models import AICall
+        session = self.Session()
+        try:
+            query = session.query(
+                AICall.group_name, AICall.prefix_hash,
+                func.count(AICall.id),
+                func.sum(AICall.prompt_tokens),
+                func.sum(AICall.cached_tokens),
+                func.min(AICall.created_at),
+                func.max(AICall.created_at),
+            ).filter(AICall.created_at >= datetime.now() - timedelta(days=days), AICall.outcome == "ok")
+            if group_name:
+                query = query.filter(AICall.group_name == group_name)
+            rows = query.group_by(AICall.group_name, AICall.prefix_hash).order_by(func.count(AICall.id).desc()).all()
+            return [{
+                "group_name": row[0],
+                "prefix_hash": row[1],
+                "calls": row[2],
+                "cache_hit_rate": (row[4] or 0) / row[3] if row[3] else 0.0,
+                "first_seen": row[5],
+                "last_seen": row[6],
+            } for row in rows]
+        finally:
+            session.close()
+
     def get_messages(self, group_name=None, limit=50):
         """获取聊天记录"""
+        from .db_models import ChatMessage
         session = self.Session()
         try:
             query = session.query(ChatMessage)
@@ -63,6 +268,7 @@ class DatabaseManager:
 
     def delete_messages(self, group_name=None, before_date=None):
         """删除聊天记录"""
+        from .db_models import ChatMessage
         session = self.Session()
         try:
             query = session.query(ChatMessage)
@@ -80,10 +286,41 @@ class DatabaseManager:
         finally:
             session.close()
 
+    def get_group_memory(self, group_name):
+        """获取群组的对话摘要"""
+        from .db_models import GroupMemory
+        session = self.Session()
+        try:
+            memory = session.get(GroupMemory, group_name)
+            return memory.summary if memory else None
+        finally:
+            session.close()
+
+    def save_group_memory(self, group_name, summary, covered_until=None):
+        """保存群组的对话摘要，covered_until 之前的聊天记录已包含在摘要中"""
+        from .db_models import GroupMemory
+        session = self.Session()
+        try:
+            session.merge(GroupMemory(group_name=group_name, summary=summary, covered_until=covered_until,
+                                      updated_at=datetime.now()))
+            session.commit()
+            return True
+        except Exception as e:
+            print(f"保存对话摘要失败: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
     def close(self):
         """关闭数据库连接"""
         try:
-            if hasattr(self, 'conn'):
-                self.conn.close()
+            # 写完队列中尚未保存的记录
+            self.writer.close()
+            if self.engine is not None:
+                # 让 SQLite 根据本次的查询更新统计信息
+                with self.engine.connect() as conn:
+                    conn.exec_driver_sql("PRAGMA optimize")
+                self.engine.dispose()
         except Exception as e:
             print(f"关闭数据库连接失败: {e}") 
\ No newline at end of file
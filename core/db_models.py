@@ -0,0 +1,57 @@
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, Float, Index
+from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+
+# 数据表定义单独放在这里，DatabaseManager/ResponseCache 首次访问数据库时才导入 SQLAlchemy
+Base = declarative_base()
+CacheBase = declarative_base()  # data/response_cache.db
+
+class ChatMessage(Base):
+    __tablename__ = 'chat_messages'
+    
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(String(100))
+    sender_name = Column(String(100))
+    group_name = Column(String(100))
+    message = Column(Text)
+    reply = Column(Text)
+    model = Column(String(100))
+    mark = Column(String(100))
+    created_at = Column(DateTime, default=datetime.now)
+
+class GroupMemory(Base):
+    __tablename__ = 'group_memories'
+
+    group_name = Column(String(100), primary_key=True)
+    summary = Column(Text)
+    covered_until = Column(DateTime)  # 早于该时间的聊天记录已合并进摘要或已被清除，恢复历史时跳过
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class AICall(Base):
+    """每次模型调用的用量记录"""
+    __tablename__ = 'ai_calls'
+    __table_args__ = (Index('ix_ai_calls_group_created', 'group_name', 'created_at'),)
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    group_name = Column(String(100))
+    provider = Column(String(50))
+    model = Column(String(100))
+    outcome = Column(String(20))  # ok / error / timeout / cancelled
+    latency = Column(Float)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    estimated = Column(Boolean, default=False)  # 接口未返回用量时按文本估算
+    prefix_hash = Column(String(16))  # 系统提示词+摘要等固定前缀的指纹，用于观察缓存命中条件
+    cost = Column(Float, default=0.0)
+
+class CachedResponse(CacheBase):
+    __tablename__ = 'cached_responses'
+
+    key = Column(String(64), primary_key=True)
+    response = Column(Text)
+    model = Column(String(100))
+    created_at = Column(Float, index=True)
+    expires_at = Column(Float)
+    hits = Column(Integer, default=0)
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+_STOP = object()
+
+
+class BatchWriter:
+    """延迟批量写入数据库
+
+    记录先放入有界队列立即返回，由后台线程合并后在一个事务中写入：
+    攒够 batch_size 条或第一条记录等待超过 flush_interval 秒就提交一次。
+    submit 在事件循环中调用，队列满时不等待，直接丢弃并计数。
+    """
+
+    def __init__(self, write_batch: Callable[[List[tuple]], int], batch_size: int = 200,
+                 flush_interval: float = 0.5, max_queue: int = 10000):
+        self.write_batch = write_batch  # 写入一批记录，返回成功写入的条数
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        self.max_depth = 0
+        self.rows_written = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_flush = None
+        self.max_flush = 0.0
+        self._flush_total = 0.0
+
+    @classmethod
+    def from_settings(cls, write_batch: Callable[[List[tuple]], int], settings: dict) -> "BatchWriter":
+        return cls(write_batch, settings["batch_size"], settings["flush_interval_ms"] / 1000,
+                   settings["max_queue"])
+
+    def _ensure_thread(self):
+        # 首次写入时才启动线程
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, item: tuple) -> bool:
+        """放入写入队列（线程安全，不需要事件循环）；关闭后改为直接同步写入"""
+        if self._closed:
+            return self._flush([item]) == 1
+        if self._thread is None:
+            self._ensure_thread()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            print(f"数据库写入队列已满，丢弃记录: {item[0]}")
+            return False
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch, waiters = [], []
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    if isinstance(item, threading.Event):
+                        # 有人在等待刷新，立即写入当前这一批
+                        waiters.append(item)
+                        break
+                    batch.append(item)
+            if batch:
+                self._flush(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _flush(self, batch: List[tuple]) -> int:
+        started = time.perf_counter()
+        try:
+            written = self.write_batch(batch)
+        except Exception as e:
+            print(f"批量写入数据库失败: {e}")
+            written = 0
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.batches += 1
+            self.rows_written += written
+            self.failed += len(batch) - written
+            self.last_flush = elapsed
+            self.max_flush = max(self.max_flush, elapsed)
+            self._flush_total += elapsed
+        return written
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前放入队列的记录全部写入"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10):
+        """写完队列中剩余的记录后停止线程"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("数据库写入队列已满，关闭时未能写完全部记录")
+            return
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"数据库写入超过 {timeout} 秒未完成，剩余 {self._queue.qsize()} 条记录")
+
+    def stats(self) -> dict:
+        """队列深度、写入条数和刷新耗时"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "capacity": self._queue.maxsize,
+                "rows_written": self.rows_written,
+                "batches": self.batches,
+                "avg_batch": self.rows_written / self.batches if self.batches else 0.0,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "last_flush_ms": None if self.last_flush is None else self.last_flush * 1000,
+                "avg_flush_ms": self._flush_total / self.batches * 1000 if self.batches else None,
+                "max_flush_ms": self.max_flush * 1000,
+            }
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Iterable, Optional
+
+
+class GroupResolver:
+    """聊天窗口 -> 监听群组 的精确映射
+
+    以聊天窗口的 who/name 属性为键精确匹配群名，并按聊天窗口对象缓存结果；
+    resolve 在采集线程中调用，增删群组在事件循环中调用，因此用锁保护。
+    """
+
+    def __init__(self, groups: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._index: Dict[str, str] = {}
+        self._cache: Dict[object, str] = {}
+        self.rebuild(groups)
+
+    @staticmethod
+    def chat_name(chat) -> Optional[str]:
+        """获取聊天窗口对应的名称"""
+        for attr in ("who", "name"):
+            name = getattr(chat, attr, None)
+            if name:
+                return name
+        return None
+
+    def rebuild(self, groups: Iterable[str]):
+        """根据群组列表重建索引"""
+        with self._lock:
+            self._index = {group: group for group in groups}
+            self._cache.clear()
+
+    def add(self, group_name: str):
+        """添加群组"""
+        with self._lock:
+            self._index[group_name] = group_name
+
+    def remove(self, group_name: str):
+        """移除群组，并使相关的缓存失效"""
+        with self._lock:
+            self._index.pop(group_name, None)
+            self._cache = {chat: group for chat, group in self._cache.items() if group != group_name}
+
+    def resolve(self, chat) -> Optional[str]:
+        """查找聊天窗口对应的群组，未监听则返回 None"""
+        with self._lock:
+            try:
+                group = self._cache.get(chat)
+            except TypeError:
+                # 不可哈希的聊天对象不做缓存
+                return self._index.get(self.chat_name(chat))
+            if group is not None:
+                return group
+
+            group = self._index.get(self.chat_name(chat))
+            if group is not None:
+                self._cache[chat] = group
+            return group
@@ -0,0 +1,47 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict
+
+
+class MessageDeduplicator:
+    """按群组的消息去重器
+
+    每个群保存一个按插入顺序排列、容量固定的指纹 LRU，成员判断与淘汰都是 O(1)。
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._seen: Dict[str, OrderedDict] = {}
+        self.duplicate_count = 0
+
+    @staticmethod
+    def fingerprint(msg) -> bytes:
+        """生成稳定的消息指纹：发送者 + 内容 + wxauto 消息 id（可用时）"""
+        msg_id = getattr(msg, "msg_id", None)
+        raw = f"{msg.sender}\x1f{msg.content}\x1f{msg_id if msg_id is not None else ''}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+    def is_duplicate(self, group_name: str, msg) -> bool:
+        """判断消息是否已处理过，未处理过则记录下来"""
+        seen = self._seen.get(group_name)
+        if seen is None:
+            seen = self._seen[group_name] = OrderedDict()
+
+        key = self.fingerprint(msg)
+        if key in seen:
+            seen.move_to_end(key)
+            self.duplicate_count += 1
+            return True
+
+        seen[key] = None
+        if len(seen) > self.capacity:
+            seen.popitem(last=False)
+        return False
+
+    def forget(self, group_name: str):
+        """清除指定群的去重记录"""
+        self._seen.pop(group_name, None)
+
+    def clear(self):
+        """清除所有去重记录"""
+        self._seen.clear()
@@ -0,0 +1,105 @@
+import asyncio
+import traceback
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class MessageDispatcher:
+    """消息分发器
+
+    每个群组一个工作协程，保证群内消息按顺序处理；不同群组之间并发，
+    并由全局信号量限制同时处理的消息数量。
+
+    提供 key_func 时，与本群排队中或正在处理的消息合并键相同的新消息不再单独处理，
+    而是附加到那条消息上，由 handler(msg, group_name, followers) 一并回复。
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable], max_concurrency: int = 4,
+                 key_func: Optional[Callable[[object, str], Optional[Hashable]]] = None):
+        self.handler = handler
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.key_func = key_func  # 返回合并键，None 表示不合并
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[str, Deque[Tuple[Optional[Hashable], object, List]]] = {}
+        self._current: Dict[str, Tuple[Optional[Hashable], List]] = {}  # 各群正在处理的消息
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.active = 0
+        self.processed = 0
+        self.coalesced = 0
+
+    def _coalesce_key(self, msg, group_name: str) -> Optional[Hashable]:
+        if self.key_func is None:
+            return None
+        try:
+            return self.key_func(msg, group_name)
+        except Exception as e:
+            print(f"计算消息合并键失败: {e}")
+            return None
+
+    def _attach(self, msg, group_name: str, key: Hashable) -> bool:
+        """附加到本群正在处理或排队中的相同消息上"""
+        current = self._current.get(group_name)
+        if current and current[0] == key:
+            current[1].append(msg)
+            return True
+        for entry_key, _, followers in self._queues.get(group_name, ()):
+            if entry_key == key:
+                followers.append(msg)
+                return True
+        return False
+
+    def dispatch(self, msg, group_name: str):
+        """把消息放入对应群组的队列（需在事件循环中调用）"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        key = self._coalesce_key(msg, group_name)
+        if key is not None and self._attach(msg, group_name, key):
+            self.coalesced += 1
+            return
+        self._queues.setdefault(group_name, deque()).append((key, msg, []))
+        if group_name not in self._workers:
+            self._workers[group_name] = asyncio.get_running_loop().create_task(self._worker(group_name))
+
+    async def _worker(self, group_name: str):
+        """依次处理单个群组的消息，队列清空后退出"""
+        queue = self._queues[group_name]
+        try:
+            while queue:
+                key, msg, followers = queue.popleft()
+                async with self._semaphore:
+                    self.active += 1
+                    self._current[group_name] = (key, followers)
+                    try:
+                        await self.handler(msg, group_name, followers)
+                    except Exception as e:
+                        print(f"处理消息失败 - 群: {group_name}, 错误: {e}")
+                        traceback.print_exc()
+                    finally:
+                        self._current.pop(group_name, None)
+                        self.active -= 1
+                        self.processed += 1
+        finally:
+            # 分发和退出都在事件循环线程中执行，这里没有竞争
+            self._current.pop(group_name, None)
+            self._workers.pop(group_name, None)
+            if not queue:
+                self._queues.pop(group_name, None)
+
+    def cancel_all(self):
+        """取消所有工作协程并丢弃未处理的消息"""
+        for task in list(self._workers.values()):
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._current.clear()
+
+    def get_stats(self) -> dict:
+        """获取分发统计"""
+        return {
+            "active": self.active,
+            "workers": len(self._workers),
+            "pending": sum(len(queue) for queue in self._queues.values()),
+            "processed": self.processed,
+            "coalesced": self.coalesced,  # 与排队中或处理中的相同问题合并的消息数
+            "max_concurrency": self.max_concurrency,
+        }
@@ -0,0 +1,189 @@
+import asyncio
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Callable, NamedTuple, Optional
+from .poll_scheduler import PollScheduler
+
+
+class Message(NamedTuple):
+    """消息数据类"""
+    sender: str
+    content: str
+    room_id: str
+    msg_id: Optional[str] = None  # wxauto 消息 id，用于去重
+
+
+class MessageIngestor:
+    """消息采集线程
+
+    独占微信传输层实例，所有 UI 自动化调用（轮询、添加监听、发送等）都在该线程中串行执行，
+    解码后的 Message 通过 call_soon_threadsafe 投递到事件循环的 asyncio.Queue 中。
+    """
+
+    def __init__(self, transport_factory: Callable, resolve_group: Callable,
+                 scheduler: Optional[PollScheduler] = None):
+        self.transport_factory = transport_factory
+        self.resolve_group = resolve_group  # chat -> 群名，在采集线程中调用
+        self.scheduler = scheduler or PollScheduler()
+        self.wx = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inbox: Optional[asyncio.Queue] = None
+        self._commands: "queue.Queue" = queue.Queue()
+        self._wakeup = threading.Event()
+        self._polling = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_started(self, loop: asyncio.AbstractEventLoop, inbox: asyncio.Queue):
+        """启动采集线程（已启动则只更新投递目标）"""
+        self._loop = loop
+        self._inbox = inbox
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="wx-ingestor", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """在采集线程中执行 func(wx, *args, **kwargs)，返回 concurrent Future"""
+        future = Future()
+        if self._stopped.is_set() or not (self._thread and self._thread.is_alive()):
+            future.set_exception(RuntimeError("消息采集线程未运行"))
+            return future
+        self._commands.put((future, func, args, kwargs))
+        self._wakeup.set()
+        return future
+
+    def start_polling(self):
+        """开始轮询监听消息"""
+        self.scheduler.reset()
+        self._polling.set()
+        self._wakeup.set()
+
+    def stop_polling(self):
+        """暂停轮询"""
+        self._polling.clear()
+
+    def stop(self, timeout: float = 5):
+        """停止采集线程"""
+        self._polling.clear()
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """采集线程主循环"""
+        com_initialized = False
+        try:
+            try:
+                # UI 自动化依赖 COM，每个线程都需要单独初始化
+                import pythoncom
+                pythoncom.CoInitialize()
+                com_initialized = True
+            except ImportError:
+                pass
+
+            try:
+                self.wx = self.transport_factory()
+            except Exception as e:
+                print(f"初始化微信实例失败: {e}")
+                self._fail_pending(e)
+                self._stopped.set()
+                return
+
+            next_poll = 0.0
+            while not self._stopped.is_set():
+                self._run_commands()
+
+                now = time.monotonic()
+                if self._polling.is_set() and now >= next_poll:
+                    next_poll = now + self._poll_once()
+
+                if self._polling.is_set():
+                    timeout = max(0.0, next_poll - time.monotonic())
+                else:
+                    timeout = None
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+        finally:
+            self._fail_pending(RuntimeError("消息采集线程已停止"))
+            self.wx = None
+            if com_initialized:
+                try:
+                    import pythoncom
+                    pythoncom.CoUninitialize()
+                except Exception:
+                    pass
+
+    def _run_commands(self):
+        """执行排队的微信调用"""
+        while True:
+            try:
+                future, func, args, kwargs = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(self.wx, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _fail_pending(self, error: Exception):
+        """线程退出时让所有未执行的调用失败"""
+        while True:
+            try:
+                future, _, _, _ = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _poll_once(self) -> float:
+        """轮询一次监听消息，返回距下一次轮询的等待时间"""
+        try:
+            msgs = self.wx.GetListenMessage()
+        except Exception as e:
+            error_msg = str(e)
+            print(f"消息处理循环错误: {error_msg}")
+            # 检查是否是微信窗口关闭错误，交给事件循环处理后停止轮询
+            if "事件无法调用任何订户" in error_msg or "-2147220991" in error_msg:
+                self._polling.clear()
+                self._deliver(e)
+            return self.scheduler.record_error()
+
+        count = 0
+        if msgs:
+            for chat, one_msgs in msgs.items():
+                group_name = self.resolve_group(chat)
+                if not group_name:
+                    continue
+                count += len(one_msgs)
+                for msg_data in one_msgs:
+                    try:
+                        self._deliver(Message(
+                            sender=msg_data.sender,
+                            content=msg_data.content,
+                            room_id=group_name,
+                            msg_id=getattr(msg_data, "id", None)
+                        ))
+                    except Exception as e:
+                        print(f"解析单条消息错误: {e}")
+                        traceback.print_exc()
+        return self.scheduler.record_poll(count)
+
+    def _deliver(self, item):
+        """把消息投递到事件循环的队列"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._inbox.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
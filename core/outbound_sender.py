@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+
+class TokenBucket:
+    """令牌桶限速器（只在发送线程中使用，不加锁）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离有一个可用令牌还需等待的时间"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        """消耗一个令牌"""
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens -= 1
+
+
+class OutboundMessage(NamedTuple):
+    """待发送的消息"""
+    group_name: str
+    text: str
+    enqueued_at: float
+    future: Future
+
+
+class OutboundSender:
+    """出站消息队列
+
+    单个发送线程按顺序取出消息，连续发往同一群的消息会合并为一条，
+    发送前分别受群组令牌桶和全局令牌桶限速，避免突发触发微信风控。
+    """
+
+    def __init__(self, send_func: Callable[[str, str], None], group_rate: float = 1.0, group_burst: float = 3,
+                 global_rate: float = 2.0, global_burst: float = 5, coalesce_max_chars: int = 2000):
+        self.send_func = send_func  # send_func(group_name, text)，阻塞直到发送完成
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.coalesce_max_chars = coalesce_max_chars
+        self._group_buckets: Dict[str, TokenBucket] = {}
+        self._queue: Deque[OutboundMessage] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # 统计
+        self.sent_count = 0
+        self.failed_count = 0
+        self.coalesced_count = 0
+        self.max_queue_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_send_duration = 0.0
+
+    @classmethod
+    def from_settings(cls, send_func: Callable[[str, str], None], settings: dict) -> "OutboundSender":
+        """根据配置创建发送队列"""
+        return cls(
+            send_func,
+            group_rate=settings.get("group_rate", 1.0),
+            group_burst=settings.get("group_burst", 3),
+            global_rate=settings.get("global_rate", 2.0),
+            global_burst=settings.get("global_burst", 5),
+            coalesce_max_chars=settings.get("coalesce_max_chars", 2000),
+        )
+
+    def start(self):
+        """启动发送线程"""
+        with self._cond:
+            self._stopping = False
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="wx-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """停止发送线程，先尽量发完队列中的消息"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._thread = None
+        # 超时未发出的消息直接失败
+        with self._cond:
+            while self._queue:
+                item = self._queue.popleft()
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("发送队列已停止"))
+
+    def enqueue(self, group_name: str, text: str) -> Future:
+        """把消息放入发送队列，返回发送结果的 Future"""
+        future = Future()
+        with self._cond:
+            self._queue.append(OutboundMessage(group_name, text, time.monotonic(), future))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _run(self):
+        """发送线程主循环"""
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch = self._take_batch()
+
+            group_name = batch[0].group_name
+            self._wait_for_tokens(group_name)
+            text = "\n".join(item.text for item in batch)
+
+            started = time.monotonic()
+            try:
+                self.send_func(group_name, text)
+            except Exception as e:
+                print(f"发送消息失败 - 群: {group_name}, 错误: {e}")
+                self.failed_count += len(batch)
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            now = time.monotonic()
+            self.last_send_duration = now - started
+            self.sent_count += 1
+            self.coalesced_count += len(batch) - 1
+            for item in batch:
+                latency = now - item.enqueued_at
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                item.future.set_result(latency)
+
+    def _take_batch(self) -> List[OutboundMessage]:
+        """取出队首消息，并合并紧随其后发往同一群的消息（调用方持有锁）"""
+        batch = [self._queue.popleft()]
+        size = len(batch[0].text)
+        while self._queue and self._queue[0].group_name == batch[0].group_name:
+            size += len(self._queue[0].text) + 1
+            if size > self.coalesce_max_chars:
+                break
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _wait_for_tokens(self, group_name: str):
+        """等待群组和全局令牌桶都有可用令牌"""
+        bucket = self._group_buckets.get(group_name)
+        if bucket is None:
+            bucket = self._group_buckets[group_name] = TokenBucket(self.group_rate, self.group_burst)
+        while True:
+            now = time.monotonic()
+            wait = max(bucket.wait_time(now), self.global_bucket.wait_time(now))
+            if wait <= 0:
+                bucket.consume(now)
+                self.global_bucket.consume(now)
+                return
+            time.sleep(wait)
+
+    def get_stats(self) -> dict:
+        """获取发送统计（队列深度、发送延迟等）"""
+        delivered = self.sent_count + self.coalesced_count
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "sent": self.sent_count,
+            "coalesced": self.coalesced_count,
+            "failed": self.failed_count,
+            "avg_latency": self.total_latency / delivered if delivered else 0.0,
+            "max_latency": self.max_latency,
+            "last_send_duration": self.last_send_duration,
+        }
@@ -0,0 +1,78 @@
+import random
+import threading
+
+
+class PollScheduler:
+    """自适应轮询调度器
+
+    有新消息时把轮询间隔收紧到 min_interval，空闲时按 decay 指数放大直到 max_interval，
+    出错时使用带抖动的指数退避。
+    """
+
+    def __init__(self, min_interval: float = 0.1, max_interval: float = 2.0, decay: float = 1.5,
+                 error_backoff: float = 1.0, max_error_backoff: float = 30.0):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.decay = max(decay, 1.0)
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self._lock = threading.Lock()
+        self._interval = self.min_interval
+        self._errors = 0
+        self.poll_count = 0
+        self.error_count = 0
+        self.message_count = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "PollScheduler":
+        """根据配置创建调度器"""
+        return cls(
+            min_interval=settings.get("min_interval", 0.1),
+            max_interval=settings.get("max_interval", 2.0),
+            decay=settings.get("decay", 1.5),
+            error_backoff=settings.get("error_backoff", 1.0),
+            max_error_backoff=settings.get("max_error_backoff", 30.0),
+        )
+
+    @property
+    def interval(self) -> float:
+        """当前（非错误状态下的）轮询间隔"""
+        return self._interval
+
+    def record_poll(self, message_count: int) -> float:
+        """记录一次成功轮询，返回下一次轮询前的等待时间"""
+        with self._lock:
+            self.poll_count += 1
+            self.message_count += message_count
+            self._errors = 0
+            if message_count:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self._interval * self.decay, self.max_interval)
+            return self._interval
+
+    def record_error(self) -> float:
+        """记录一次轮询失败，返回带抖动的退避时间"""
+        with self._lock:
+            self.poll_count += 1
+            self.error_count += 1
+            self._errors += 1
+            # 限制指数，长时间连续失败时 2 ** n 不会溢出 float
+            ceiling = min(self.error_backoff * (2 ** min(self._errors - 1, 16)), self.max_error_backoff)
+            # 抖动范围 [ceiling/2, ceiling]，避免与微信客户端同步重试
+            return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def reset(self):
+        """重新开始监听时把间隔恢复到最小值"""
+        with self._lock:
+            self._interval = self.min_interval
+            self._errors = 0
+
+    def get_stats(self) -> dict:
+        """获取调度器统计信息"""
+        return {
+            "interval": self._interval,
+            "poll_count": self.poll_count,
+            "error_count": self.error_count,
+            "message_count": self.message_count,
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+from .retry_policy import classify_error, error_status_code
+
+
+class ProviderHealth:
+    """单个模型的连接状态"""
+
+    UNKNOWN = "unknown"
+    PROBING = "probing"
+    READY = "ready"
+    AUTH_ERROR = "auth_error"    # API密钥无效或无权限
+    UNREACHABLE = "unreachable"  # 网络不通、超时或服务端错误
+    ERROR = "error"
+
+    def __init__(self):
+        self.status = self.UNKNOWN
+        self.baseline_latency: Optional[float] = None  # 首次探测成功的耗时
+        self.last_latency: Optional[float] = None
+        self.last_checked = 0.0
+        self.error = ""
+
+    def summary(self) -> dict:
+        return {
+            "status": self.status,
+            "baseline_latency": self.baseline_latency,
+            "last_latency": self.last_latency,
+            "last_checked": self.last_checked,
+            "error": self.error,
+        }
+
+
+class HealthMonitor:
+    """启动服务时在后台预热各模型的连接并做一次需要鉴权的轻量探测，之后定期探测保持长连接"""
+
+    def __init__(self, get_provider: Callable[[str], object], settings: dict):
+        self.get_provider = get_provider
+        self.settings = settings
+        self.providers: Dict[str, ProviderHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._on_change: Optional[Callable[[Dict[str, dict]], None]] = None
+
+    def start(self, names: List[str], on_change: Optional[Callable[[Dict[str, dict]], None]] = None):
+        """开始探测（不等待结果），names 为已配置API密钥的模型"""
+        self.stop()
+        self._on_change = on_change
+        self.providers = {name: self.providers.get(name) or ProviderHealth() for name in names}
+        if names and self.settings.get("enabled", True):
+            self._task = asyncio.ensure_future(self._run(names))
+        self._notify()
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, names: List[str]):
+        try:
+            while True:
+                await asyncio.gather(*(self.probe(name) for name in names))
+                await asyncio.sleep(self.settings.get("keepalive_interval", 45))
+        except asyncio.CancelledError:
+            pass
+
+    async def probe(self, name: str):
+        """探测单个模型并更新状态"""
+        health = self.providers.setdefault(name, ProviderHealth())
+        if health.status == ProviderHealth.UNKNOWN:
+            health.status = ProviderHealth.PROBING
+            self._notify()
+        try:
+            # 首次创建客户端需要导入 SDK，放到线程中避免阻塞事件循环
+            provider = await asyncio.to_thread(self.get_provider, name)
+            started = time.monotonic()
+            await asyncio.wait_for(provider.probe(), self.settings.get("probe_timeout", 10))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = self._classify(e)
+            if status != health.status:
+                print(f"{name} 连接探测失败: {e}")
+            health.status = status
+            health.error = str(e)
+        else:
+            health.last_latency = time.monotonic() - started
+            if health.baseline_latency is None:
+                health.baseline_latency = health.last_latency
+            health.status = ProviderHealth.READY
+            health.error = ""
+        health.last_checked = time.time()
+        self._notify()
+
+    @staticmethod
+    def _classify(error: Exception) -> str:
+        if error_status_code(error) in (401, 403):
+            return ProviderHealth.AUTH_ERROR
+        retryable, _ = classify_error(error)
+        return ProviderHealth.UNREACHABLE if retryable else ProviderHealth.ERROR
+
+    def _notify(self):
+        if self._on_change:
+            try:
+                self._on_change(self.summary())
+            except Exception as e:
+                print(f"更新模型状态失败: {e}")
+
+    def summary(self) -> Dict[str, dict]:
+        return {name: health.summary() for name, health in self.providers.items()}
@@ -0,0 +1,211 @@
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# 直方图桶：从 50ms 开始按 1.25 倍递增，覆盖到约 2 分钟
+_BUCKET_BASE = 0.05
+_BUCKET_GROWTH = 1.25
+_BUCKET_COUNT = 36
+
+
+class LatencyHistogram:
+    """对数分桶的流式耗时直方图，O(1) 记录，分位数误差不超过一个桶宽"""
+
+    def __init__(self, counts: Optional[List[int]] = None):
+        self.counts = list(counts) if counts else [0] * _BUCKET_COUNT
+        self.total = sum(self.counts)
+
+    @staticmethod
+    def _bucket(latency: float) -> int:
+        if latency <= _BUCKET_BASE:
+            return 0
+        index = int(math.log(latency / _BUCKET_BASE, _BUCKET_GROWTH)) + 1
+        return min(index, _BUCKET_COUNT - 1)
+
+    @staticmethod
+    def _upper_bound(index: int) -> float:
+        return _BUCKET_BASE * (_BUCKET_GROWTH ** index)
+
+    def record(self, latency: float):
+        self.counts[self._bucket(latency)] += 1
+        self.total += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """返回分位数（取所在桶的上界）"""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self._upper_bound(index)
+        return self._upper_bound(_BUCKET_COUNT - 1)
+
+
+class ProviderStatistics:
+    """单个模型的实时统计"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.tokens_per_second: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.histogram = LatencyHistogram()
+        self.updated_at = 0.0
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.alpha * (value - current)
+
+    def record_success(self, latency: float, tokens: int = 0):
+        self.successes += 1
+        self.ewma_latency = self._ewma(self.ewma_latency, latency)
+        self.error_rate = self._ewma(self.error_rate, 0.0)
+        if tokens and latency > 0:
+            self.tokens_per_second = self._ewma(self.tokens_per_second, tokens / latency)
+        self.histogram.record(latency)
+        self.updated_at = time.time()
+
+    def record_failure(self):
+        self.failures += 1
+        self.error_rate = self._ewma(self.error_rate, 1.0)
+        self.updated_at = time.time()
+
+    def current_error_rate(self, half_life: float = 0) -> float:
+        """按距上次更新的时间衰减的错误率，不再被选中的模型也能逐渐恢复"""
+        if not half_life or not self.updated_at:
+            return self.error_rate
+        age = max(0.0, time.time() - self.updated_at)
+        return self.error_rate * 0.5 ** (age / half_life)
+
+    def score(self, default_latency: float, half_life: float = 0) -> float:
+        """路由评分（越小越好）：EWMA 耗时按错误率加权"""
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return latency * (1 + 4 * self.current_error_rate(half_life))
+
+    def to_dict(self) -> dict:
+        return {
+            "ewma_latency": self.ewma_latency,
+            "error_rate": self.error_rate,
+            "tokens_per_second": self.tokens_per_second,
+            "successes": self.successes,
+            "failures": self.failures,
+            "histogram": self.histogram.counts,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, alpha: float = 0.2) -> "ProviderStatistics":
+        stats = cls(alpha)
+        stats.ewma_latency = data.get("ewma_latency")
+        stats.error_rate = data.get("error_rate", 0.0)
+        stats.tokens_per_second = data.get("tokens_per_second")
+        stats.successes = data.get("successes", 0)
+        stats.failures = data.get("failures", 0)
+        counts = data.get("histogram")
+        if counts and len(counts) == _BUCKET_COUNT:
+            stats.histogram = LatencyHistogram(counts)
+        stats.updated_at = data.get("updated_at", 0.0)
+        return stats
+
+    def summary(self, half_life: float = 0) -> dict:
+        """可供界面显示的统计摘要"""
+        total = self.successes + self.failures
+        return {
+            "ewma_latency": self.ewma_latency,
+            "p50": self.histogram.percentile(0.50),
+            "p95": self.histogram.percentile(0.95),
+            "p99": self.histogram.percentile(0.99),
+            "error_rate": self.current_error_rate(half_life),
+            "tokens_per_second": self.tokens_per_second,
+            "calls": total,
+        }
+
+
+class ProviderStats:
+    """所有模型的统计，定期保存到 data/provider_stats.json，重启后继续使用
+
+    错误率每过 error_half_life 秒减半，出错后不再被 auto 选中的模型过一段时间会重新参与选择。
+    """
+
+    def __init__(self, path: str = os.path.join('data', 'provider_stats.json'), alpha: float = 0.2,
+                 default_latency: float = 5.0, save_every: int = 20, error_half_life: float = 300):
+        self.path = Path(path)
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.error_half_life = error_half_life
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.providers: Dict[str, ProviderStatistics] = {}
+        self.load()
+
+    def get(self, name: str) -> ProviderStatistics:
+        stats = self.providers.get(name)
+        if stats is None:
+            stats = self.providers[name] = ProviderStatistics(self.alpha)
+        return stats
+
+    def record_success(self, name: str, latency: float, tokens: int = 0):
+        self.get(name).record_success(latency, tokens)
+        self._mark_dirty()
+
+    def record_failure(self, name: str):
+        self.get(name).record_failure()
+        self._mark_dirty()
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        stats = self.providers.get(name)
+        return stats.histogram.percentile(q) if stats else None
+
+    def sample_count(self, name: str) -> int:
+        stats = self.providers.get(name)
+        return stats.histogram.total if stats else 0
+
+    def best(self, candidates: Iterable[str]) -> Optional[str]:
+        """返回当前表现最好的模型（评分相同时保持候选顺序）"""
+        best_name, best_score = None, None
+        for name in candidates:
+            score = self.get(name).score(self.default_latency, self.error_half_life)
+            if best_score is None or score < best_score:
+                best_name, best_score = name, score
+        return best_name
+
+    def _mark_dirty(self):
+        self._dirty += 1
+        if self._dirty >= self.save_every:
+            self.save()
+
+    def load(self):
+        """从文件加载统计"""
+        try:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.providers = {
+                    name: ProviderStatistics.from_dict(item, self.alpha) for name, item in data.items()
+                }
+        except Exception as e:
+            print(f"加载模型统计失败: {e}")
+
+    def save(self):
+        """保存统计到文件"""
+        with self._lock:
+            self._dirty = 0
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                data = {name: stats.to_dict() for name, stats in self.providers.items()}
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+            except Exception as e:
+                print(f"保存模型统计失败: {e}")
+
+    def summary(self) -> Dict[str, dict]:
+        """所有模型的统计摘要"""
+        return {name: stats.summary(self.error_half_life) for name, stats in self.providers.items()}
@@ -0,0 +1,51 @@
+import re
+from typing import List
+
+# 段落/句子边界：换行、中文句末标点，以及后面跟空白的英文句末标点
+_BOUNDARY = re.compile(r"\n+|[。！？；…]+[”’」』）)]*|[.!?;]+[\"')\]]*(?=\s)")
+
+
+class SentenceChunker:
+    """把流式回复切分成适合逐条发送的片段
+
+    缓冲区在段落或句子边界处切分，且每段至少 min_chars 个字符；
+    超过 max_chars 仍没有边界时强制切分。
+    """
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 500):
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars)
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """追加一段文本，返回已可以发送的片段"""
+        self._buffer += delta
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut <= 0:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> List[str]:
+        """返回缓冲区中剩余的文本"""
+        chunk = self._buffer.strip()
+        self._buffer = ""
+        return [chunk] if chunk else []
+
+    def _find_cut(self) -> int:
+        """找到第一个满足最小长度的边界位置，没有则返回 0"""
+        if len(self._buffer) < self.min_chars:
+            return 0
+        cut = 0
+        for m in _BOUNDARY.finditer(self._buffer):
+            if m.end() >= self.min_chars:
+                cut = m.end()
+                break
+        if not cut and len(self._buffer) >= self.max_chars:
+            cut = self.max_chars
+        return cut
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+_TRAILING_PUNCT = re.compile(r"[\s?？!！.。,，~～…]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """归一化问题文本：全角转半角、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", text).lower().strip()
+    text = _WHITESPACE.sub(" ", text)
+    return _TRAILING_PUNCT.sub("", text)
+
+
+class ResponseCache:
+    """AI 回复缓存
+
+    内存 LRU 为第一级，SQLite（data/response_cache.db）为第二级；
+    两级都按 TTL 过期，并按条目数淘汰最旧的记录。
+    """
+
+    def __init__(self, db_path: str = os.path.join('data', 'response_cache.db'), ttl: float = 86400,
+                 memory_entries: int = 512, db_entries: int = 20000):
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.db_entries = db_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # SQLite 第二级缓存在首次查询时才创建连接
+        self.db_path = db_path
+        self.engine = None
+        self._session_factory = None
+
+        # 统计
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "ResponseCache":
+        """根据配置创建缓存"""
+        return cls(
+            ttl=settings.get("ttl_seconds", 86400),
+            memory_entries=settings.get("memory_entries", 512),
+            db_entries=settings.get("db_entries", 20000),
+        )
+
+    def Session(self):
+        """创建数据库会话（首次调用时建立连接并建表）"""
+        if self._session_factory is None:
+            with self._lock:
+                if self._session_factory is None:
+                    from sqlalchemy import create_engine
+                    from sqlalchemy.orm import sessionmaker
+                    from .database_manager import configure_sqlite
+                    from .db_models import CacheBase
+                    engine = create_engine(f'sqlite:///{self.db_path}')
+                    configure_sqlite(engine)
+                    CacheBase.metadata.create_all(engine)
+                    self.engine = engine
+                    self._session_factory = sessionmaker(bind=engine)
+        return self._session_factory()
+
+    def prewarm(self):
+        """提前建立 SQLite 连接（在后台线程中调用）"""
+        self.Session().close()
+
+    @staticmethod
+    def make_key(question: str, system_prompt: str, model: str, scope: str = "") -> str:
+        """生成缓存键：归一化问题 + 系统提示词 + 模型（+ 可选的群组范围）"""
+        raw = "\x1f".join((normalize_question(question), system_prompt, model, scope))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """只查内存缓存"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return response
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，内存未命中时查询 SQLite 并回填内存"""
+        from .db_models import CachedResponse
+        response = self.get_memory(key)
+        if response is not None:
+            return response
+
+        session = self.Session()
+        try:
+            row = session.get(CachedResponse, key)
+            if row is None or row.expires_at < time.time():
+                self.misses += 1
+                return None
+            row.hits = (row.hits or 0) + 1
+            session.commit()
+            response, expires_at = row.response, row.expires_at
+        except Exception as e:
+            print(f"读取回复缓存失败: {e}")
+            session.rollback()
+            self.misses += 1
+            return None
+        finally:
+            session.close()
+
+        self.db_hits += 1
+        self._remember(key, response, expires_at)
+        return response
+
+    def put(self, key: str, response: str, model: str = ""):
+        """写入两级缓存"""
+        from .db_models import CachedResponse
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, response, expires_at)
+
+        session = self.Session()
+        try:
+            session.merge(CachedResponse(key=key, response=response, model=model,
+                                         created_at=now, expires_at=expires_at, hits=0))
+            session.commit()
+        except Exception as e:
+            print(f"写入回复缓存失败: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+        self._puts_since_trim += 1
+        if self._puts_since_trim >= 100:
+            self._puts_since_trim = 0
+            self.trim()
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """异步查询：内存命中直接返回，否则在线程池中查询 SQLite"""
+        response = self.get_memory(key)
+        if response is not None:
+            return response
+        return await asyncio.to_thread(self.get, key)
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        """写入内存 LRU"""
+        with self._lock:
+            self._memory[key] = (response, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def trim(self):
+        """删除过期记录，并把 SQLite 中的条目数控制在上限以内"""
+        from .db_models import CachedResponse
+        session = self.Session()
+        try:
+            session.query(CachedResponse).filter(CachedResponse.expires_at < time.time()).delete()
+            count = session.query(CachedResponse).count()
+            if count > self.db_entries:
+                oldest = (session.query(CachedResponse.key)
+                          .order_by(CachedResponse.created_at)
+                          .limit(count - self.db_entries)
+                          .subquery())
+                session.query(CachedResponse).filter(CachedResponse.key.in_(oldest.select())) \
+                    .delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            print(f"清理回复缓存失败: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    def clear(self):
+        """清空缓存"""
+        from .db_models import CachedResponse
+        with self._lock:
+            self._memory.clear()
+        session = self.Session()
+        try:
+            session.query(CachedResponse).delete()
+            session.commit()
+        finally:
+            session.close()
+
+    def get_stats(self) -> dict:
+        """获取缓存命中统计"""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
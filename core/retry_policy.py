@@ -0,0 +1,159 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码：请求超时、限流、服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# 网络层错误（openai、httpx、google SDK 的类名），不导入 SDK 也能识别
+_RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError",
+    "TimeoutException", "TransportError", "NetworkError", "RemoteProtocolError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded",
+}
+
+
+class RequestDeadlineExceeded(Exception):
+    """请求的总耗时预算已用完"""
+
+
+class Deadline:
+    """单次请求的截止时间，所有模型调用和重试共享"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def error_status_code(error: Exception) -> Optional[int]:
+    """从 SDK 异常中取出 HTTP 状态码"""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """从响应头读取 Retry-After（秒数或 HTTP 日期）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """判断错误是否可重试，返回 (可重试, Retry-After 秒数)"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True, None
+    status = error_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS, _retry_after(error)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & _RETRYABLE_ERRORS), _retry_after(error)
+
+
+class RetryPolicy:
+    """带随机抖动的指数退避，优先使用服务端给出的 Retry-After"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "RetryPolicy":
+        return cls(settings["max_attempts"], settings["base_delay"], settings["max_delay"])
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次失败（从 0 开始）后的等待时间"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: Deadline) -> float:
+        """第 attempt 次失败后的等待时间；不可重试、次数用完或剩余时间不够等待时抛出异常"""
+        if isinstance(error, asyncio.TimeoutError) and deadline.expired:
+            raise RequestDeadlineExceeded(f"请求超过 {deadline.timeout:g} 秒未完成") from error
+        retryable, retry_after = classify_error(error)
+        if not retryable or attempt >= self.max_attempts:
+            raise error
+        delay = self.backoff(attempt - 1, retry_after)
+        if delay >= deadline.remaining():
+            # 剩余时间不够再等一次退避时立即失败，不在注定超时的请求上浪费时间
+            raise RequestDeadlineExceeded(f"剩余时间不足以重试: {error}") from error
+        print(f"请求失败，{delay:.1f} 秒后重试（第 {attempt} 次）: {error}")
+        return delay
+
+    @staticmethod
+    def _check(deadline: Deadline) -> float:
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise RequestDeadlineExceeded(f"请求超过 {deadline.timeout:g} 秒未完成")
+        return remaining
+
+    async def call(self, func: Callable[[], Awaitable[T]], deadline: Deadline) -> T:
+        """在截止时间内调用 func()，可重试的错误按退避重试，其余错误直接抛出"""
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(func(), self._check(deadline))
+            except RequestDeadlineExceeded:
+                raise
+            except Exception as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+
+    async def stream(self, factory: Callable[[], AsyncIterator[T]], deadline: Deadline) -> AsyncIterator[T]:
+        """流式调用：收到第一段之前的错误按退避重试，之后的错误直接抛出；每一段都受截止时间限制"""
+        attempt = 0
+        while True:
+            iterator = factory().__aiter__()
+            started = False
+            try:
+                while True:
+                    try:
+                        item = await asyncio.wait_for(iterator.__anext__(), self._check(deadline))
+                    except StopAsyncIteration:
+                        return
+                    started = True
+                    yield item
+            except RequestDeadlineExceeded:
+                raise
+            except Exception as e:
+                if started:
+                    if isinstance(e, asyncio.TimeoutError) and deadline.expired:
+                        raise RequestDeadlineExceeded(f"请求超过 {deadline.timeout:g} 秒未完成") from e
+                    raise
+                attempt += 1
+                delay = self._retry_delay(e, attempt, deadline)
+            finally:
+                aclose = getattr(iterator, "aclose", None)
+                if aclose:
+                    await aclose()
+            await asyncio.sleep(delay)
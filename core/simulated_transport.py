@@ -0,0 +1,154 @@
+import itertools
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+
+class SimulatedChat:
+    """模拟的聊天窗口"""
+
+    def __init__(self, who: str):
+        self.who = who
+
+    def __repr__(self):
+        return f"<Simulated Chat Window for {self.who}>"
+
+
+class SimulatedMessage(NamedTuple):
+    """模拟的消息，字段与 wxauto 消息对象一致"""
+    sender: str
+    content: str
+    id: str
+    time: float
+
+
+class SentRecord(NamedTuple):
+    """一次发送记录"""
+    timestamp: float
+    who: str
+    msg: str
+
+
+class SimulatedTransport:
+    """内存中的模拟微信
+
+    按配置的速率为每个监听群生成消息流（泊松到达 + 可选突发），
+    并统计生成和发出的消息数（只保留最近 keep_recent 条及其时间戳），用于在 Linux 上压测和回归测试。
+
+    参数:
+        groups: 产生消息的群组，None 表示所有已监听的群
+        rate: 每个群每秒的平均消息数
+        trigger_ratio: 带触发词消息的比例
+        burstiness: 每次轮询时某个群出现突发的概率
+        burst_size: 突发时额外产生的消息数
+        trigger_word: 生成触发消息时使用的触发词
+        send_latency: 模拟每次发送耗费的时间（秒）
+        max_messages: 生成消息总数上限，None 表示不限
+        keep_recent: 保留最近生成和发出的消息条数，长时间压测时内存不随消息数增长
+        seed: 随机种子
+    """
+
+    def __init__(self, groups: Optional[List[str]] = None, rate: float = 0.5, trigger_ratio: float = 0.2,
+                 burstiness: float = 0.0, burst_size: int = 5, trigger_word: str = "AI",
+                 send_latency: float = 0.0, max_messages: Optional[int] = None,
+                 nickname: str = "Simulator", seed: Optional[int] = None, keep_recent: int = 1000):
+        self.nickname = nickname
+        self.groups = set(groups) if groups is not None else None
+        self.rate = rate
+        self.trigger_ratio = trigger_ratio
+        self.burstiness = burstiness
+        self.burst_size = burst_size
+        self.trigger_word = trigger_word
+        self.send_latency = send_latency
+        self.max_messages = max_messages
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._chats: Dict[str, SimulatedChat] = {}
+        self._pending: Dict[SimulatedChat, List[SimulatedMessage]] = {}
+        self._last_poll = time.monotonic()
+        self.generated: Deque[SimulatedMessage] = deque(maxlen=keep_recent)
+        self.sent: Deque[SentRecord] = deque(maxlen=keep_recent)
+        self.generated_count = 0
+        self.sent_count = 0
+
+    def AddListenChat(self, who: str, savepic: bool = False):
+        with self._lock:
+            self._chats.setdefault(who, SimulatedChat(who))
+
+    def RemoveListenChat(self, who: str):
+        with self._lock:
+            self._chats.pop(who, None)
+
+    def GetListenMessage(self) -> Dict[SimulatedChat, List[SimulatedMessage]]:
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._last_poll
+            self._last_poll = now
+            result, self._pending = self._pending, {}
+            for who, chat in self._chats.items():
+                if self.groups is not None and who not in self.groups:
+                    continue
+                count = self._poisson(self.rate * elapsed)
+                if self.burstiness and self._random.random() < self.burstiness:
+                    count += self.burst_size
+                msgs = [msg for msg in (self._make_message() for _ in range(count)) if msg]
+                if msgs:
+                    result.setdefault(chat, []).extend(msgs)
+            return result
+
+    def SendMsg(self, msg: str, who: str):
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        with self._lock:
+            self.sent.append(SentRecord(time.time(), who, msg))
+            self.sent_count += 1
+
+    def inject(self, who: str, sender: str, content: str):
+        """手动注入一条消息，下次轮询时返回"""
+        with self._lock:
+            chat = self._chats.setdefault(who, SimulatedChat(who))
+            msg = SimulatedMessage(sender, content, str(next(self._ids)), time.time())
+            self.generated.append(msg)
+            self.generated_count += 1
+            self._pending.setdefault(chat, []).append(msg)
+
+    def _make_message(self) -> Optional[SimulatedMessage]:
+        """生成一条随机消息"""
+        if self.max_messages is not None and self.generated_count >= self.max_messages:
+            return None
+        n = next(self._ids)
+        sender = f"user{self._random.randint(1, 50)}"
+        if self._random.random() < self.trigger_ratio:
+            content = f"@{self.trigger_word} 模拟问题 {n}"
+        else:
+            content = f"闲聊消息 {n}"
+        msg = SimulatedMessage(sender, content, str(n), time.time())
+        self.generated.append(msg)
+        self.generated_count += 1
+        return msg
+
+    def _poisson(self, lam: float) -> int:
+        """按泊松分布采样本次轮询到达的消息数"""
+        if lam <= 0:
+            return 0
+        if lam > 30:
+            return max(0, int(round(self._random.gauss(lam, math.sqrt(lam)))))
+        threshold = math.exp(-lam)
+        k, p = 0, self._random.random()
+        while p > threshold:
+            k += 1
+            p *= self._random.random()
+        return k
+
+    def get_stats(self) -> dict:
+        """获取模拟统计"""
+        with self._lock:
+            return {
+                "generated": self.generated_count,
+                "sent": self.sent_count,
+                "listening": len(self._chats),
+            }
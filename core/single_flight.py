@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """合并相同键的并发请求
+
+    同一时刻相同键只执行一次调用，其余请求等待并共享结果或异常。
+    单个等待者被取消不影响其他等待者；所有等待者都取消后才取消底层调用。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.executed = 0  # 实际发起的调用次数
+        self.shared = 0    # 通过合并节省的调用次数
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func()，若已有相同键的调用在进行中则等待其结果"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executed += 1
+        else:
+            self.shared += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1 and self._calls.get(key) is task:
+                # 最后一个等待者被取消，底层调用已无人需要
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """调用结束后移除记录"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            self._waiters.pop(key, None)
+        if not task.cancelled():
+            # 标记异常已被读取，避免所有等待者都取消后出现未处理异常警告
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> dict:
+        """获取合并统计"""
+        return {
+            "executed": self.executed,
+            "shared": self.shared,
+            "in_flight": self.in_flight,
+        }
@@ -0,0 +1,13 @@
+import math
+import re
+
+# 中日韩字符（含全角标点）大致一个字符一个 token，其余文本约 4 个字符一个 token
+_CJK = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数（无需加载分词器，偏保守）"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
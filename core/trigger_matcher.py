@@ -0,0 +1,83 @@
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_TRIGGERS = ("victorAI",)
+
+
+class TriggerMatcher:
+    """预编译的触发词匹配器
+
+    所有触发词编译成一个交替正则，一次扫描同时完成检测和移除：
+    - 消息开头的任意触发词（不区分大小写，可带 @）视为触发
+    - 正文中带 @ 的触发词视为触发
+    - 默认触发词不区分大小写，自定义/群组触发词区分大小写（与旧逻辑一致）
+    """
+
+    def __init__(self, custom_triggers: Iterable[str], default_triggers: Iterable[str] = DEFAULT_TRIGGERS):
+        custom = self._alternation(custom_triggers)
+        defaults = self._alternation(default_triggers)
+        everything = self._alternation(list(custom_triggers) + list(default_triggers))
+
+        branches = []
+        if everything:
+            branches.append(rf"^(?i:@?(?:{everything}))")
+        if defaults:
+            branches.append(rf"(?i:@?(?:{defaults}))")
+        if custom:
+            branches.append(rf"@?(?:{custom})")
+        self.pattern = re.compile("|".join(branches)) if branches else None
+
+    @staticmethod
+    def _alternation(words: Iterable[str]) -> str:
+        """把触发词转成正则交替分支，长词优先"""
+        unique = sorted({word for word in words if word}, key=len, reverse=True)
+        return "|".join(re.escape(word) for word in unique)
+
+    def match(self, content: str) -> Optional[str]:
+        """检测触发词；触发时返回移除触发词后的内容，否则返回 None"""
+        if self.pattern is None:
+            return None
+
+        triggered = False
+        parts = []
+        last = 0
+        for m in self.pattern.finditer(content):
+            if m.start() == 0 or content[m.start()] == "@":
+                triggered = True
+            parts.append(content[last:m.start()])
+            last = m.end()
+
+        if not triggered:
+            return None
+        parts.append(content[last:])
+        return "".join(parts).strip()
+
+
+class TriggerEngine:
+    """按群组缓存触发词匹配器，仅在触发词配置变化时重新编译"""
+
+    def __init__(self, config_manager, default_triggers: Iterable[str] = DEFAULT_TRIGGERS):
+        self.config = config_manager
+        self.default_triggers = tuple(default_triggers)
+        self._matchers: Dict[str, Tuple[tuple, TriggerMatcher]] = {}
+
+    def _signature(self, group_name: str) -> tuple:
+        """当前群组的触发词配置"""
+        return (self.config.get_trigger_word(),) + tuple(self.config.get_group_triggers(group_name))
+
+    def get_matcher(self, group_name: str) -> TriggerMatcher:
+        """获取群组的匹配器"""
+        signature = self._signature(group_name)
+        cached = self._matchers.get(group_name)
+        if cached is None or cached[0] != signature:
+            cached = (signature, TriggerMatcher(signature, self.default_triggers))
+            self._matchers[group_name] = cached
+        return cached[1]
+
+    def match(self, group_name: str, content: str) -> Optional[str]:
+        """检测并移除触发词，未触发返回 None"""
+        return self.get_matcher(group_name).match(content)
+
+    def forget(self, group_name: str):
+        """移除群组的匹配器缓存"""
+        self._matchers.pop(group_name, None)
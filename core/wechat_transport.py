@@ -0,0 +1,63 @@
+from typing import Callable, Dict, List, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class WeChatTransport(Protocol):
+    """微信收发接口
+
+    方法名与 wxauto.WeChat 保持一致，ChatManager 只依赖这几个调用。
+    """
+
+    nickname: str
+
+    def AddListenChat(self, who: str, savepic: bool = False):
+        """添加监听的聊天"""
+        ...
+
+    def RemoveListenChat(self, who: str):
+        """移除监听的聊天"""
+        ...
+
+    def GetListenMessage(self) -> Dict[object, List]:
+        """获取所有监听聊天的新消息，返回 {聊天窗口: [消息, ...]}"""
+        ...
+
+    def SendMsg(self, msg: str, who: str):
+        """向指定聊天发送消息"""
+        ...
+
+
+class WxAutoTransport:
+    """基于 wxauto 的实现（仅支持 Windows 且需要已登录的微信客户端）"""
+
+    def __init__(self):
+        from wxauto import WeChat  # 仅在使用时导入，其他平台可以正常加载本模块
+        self._wx = WeChat()
+
+    @property
+    def nickname(self) -> str:
+        return self._wx.nickname
+
+    def AddListenChat(self, who: str, savepic: bool = False):
+        return self._wx.AddListenChat(who=who, savepic=savepic)
+
+    def RemoveListenChat(self, who: str):
+        return self._wx.RemoveListenChat(who)
+
+    def GetListenMessage(self):
+        return self._wx.GetListenMessage()
+
+    def SendMsg(self, msg: str, who: str):
+        return self._wx.SendMsg(msg, who)
+
+
+def create_transport_factory(settings: dict) -> Callable[[], WeChatTransport]:
+    """根据配置返回传输层工厂（在采集线程中调用以创建实例）"""
+    backend = settings.get("backend", "wxauto")
+    if backend == "simulated":
+        from .simulated_transport import SimulatedTransport
+        simulation = settings.get("simulation", {})
+        return lambda: SimulatedTransport(**simulation)
+    if backend == "wxauto":
+        return WxAutoTransport
+    raise ValueError(f"未知的微信传输层: {backend}")
@@ -1,3 +1,6 @@
+import time
+_START = time.perf_counter()
+
 import sys
 import asyncio
 import signal
@@ -20,6 +23,7 @@ class AsyncApplication(QApplication):
         self.async_timer = QTimer()
         self.async_timer.timeout.connect(self._process_async_events)
         self.async_timer.start(10)
+        self.db_manager = None  # 收到信号退出时需要写完数据库队列
         
         # 注册信号处理
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -29,6 +33,8 @@ class AsyncApplication(QApplication):
         """处理系统信号"""
         print(f"收到信号: {signum}")
         self.cleanup()
+        if self.db_manager:
+            self.db_manager.close()
         os._exit(0)
 
     def _process_async_events(self):
@@ -95,26 +101,71 @@ class AsyncApplication(QApplication):
         except Exception as e:
             print(f"清理资源时发生错误: {e}")
 
+class StartupProfiler:
+    """启动耗时分析（--profile-startup）：打印各阶段耗时，并把 cProfile 结果保存到 data/startup.prof"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.last = _START
+        self.profile = None
+        if enabled:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            self.mark("导入模块")
+
+    def mark(self, stage: str):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        print(f"[启动] {stage}: {(now - self.last) * 1000:.0f} ms (累计 {(now - _START) * 1000:.0f} ms)")
+        self.last = now
+
+    def finish(self):
+        """窗口首次绘制完成后调用"""
+        if not self.enabled or self.profile is None:
+            return
+        self.mark("首次绘制")
+        self.profile.disable()
+        os.makedirs('data', exist_ok=True)
+        self.profile.dump_stats(os.path.join('data', 'startup.prof'))
+        import pstats
+        pstats.Stats(self.profile).sort_stats("cumulative").print_stats(15)
+        self.profile = None
+
 def main():
     try:
+        profile_startup = "--profile-startup" in sys.argv
+        if profile_startup:
+            sys.argv.remove("--profile-startup")
+        profiler = StartupProfiler(profile_startup)
+
         # 创建事件循环
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
         # 创建应用程序
         app = AsyncApplication(sys.argv)
+        profiler.mark("创建应用")
 
         # 初始化各个管理器
         config_manager = ConfigManager()
-        db_manager = DatabaseManager()
-        ai_manager = AIManager(config_manager)
+        db_manager = DatabaseManager(config_manager.get_db_writer_settings())
+        app.db_manager = db_manager
+        ai_manager = AIManager(config_manager, db_manager)
         chat_manager = ChatManager(config_manager, ai_manager, db_manager)
+        profiler.mark("初始化管理器")
 
         # 创建主窗口
         window = MainWindow(config_manager, chat_manager, db_manager, app)
         app.setWindowIcon(QIcon(":bot.ico"))  # 设置任务栏图标
         chat_manager.set_main_window(window)
         window.show()
+        profiler.mark("创建窗口")
+
+        # 窗口显示后再在后台导入模型 SDK、创建客户端并打开数据库
+        QTimer.singleShot(0, profiler.finish)
+        QTimer.singleShot(0, lambda: app.run_coroutine(ai_manager.prewarm()))
 
         # 运行应用程序
         return app.exec()
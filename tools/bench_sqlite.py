@@ -0,0 +1,214 @@
+"""聊天记录数据库基准测试：对比默认 SQLite 配置与 DatabaseManager 的存储配置
+
+生成指定行数的 chat_messages（默认 500 万行），先在默认配置（回滚日志、
+synchronous=FULL、无复合索引）下测量常用查询和写入耗时，再补上
+SQLITE_INDEXES 中的索引、应用 SQLITE_PROFILE 后重新测量。
+
+用法：
+    python tools/bench_sqlite.py --rows 5000000 --groups 300 --senders 20000
+
+生成的数据库默认放在 data/bench_chat_history.db（约 1GB），加 --keep 保留以便
+下次用 --reuse 跳过生成步骤。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database_manager import SQLITE_INDEXES, SQLITE_PROFILE, sqlite_pragmas  # noqa: E402
+
+INSERT_SQL = ("INSERT INTO chat_messages (sender_id, sender_name, group_name, message, reply, model, mark, created_at) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+QUERIES = [
+    # (名称, SQL, 参数生成函数)，与 DatabaseManager 中的查询一致
+    ("群最近50条", "SELECT * FROM chat_messages WHERE group_name = ? ORDER BY created_at DESC LIMIT 50",
+     lambda ctx: (ctx.group(),)),
+    ("恢复群历史", "SELECT message, reply FROM chat_messages WHERE group_name = ? ORDER BY created_at DESC LIMIT 50",
+     lambda ctx: (ctx.group(),)),
+    ("用户最近50条", "SELECT * FROM chat_messages WHERE sender_id = ? ORDER BY created_at DESC LIMIT 50",
+     lambda ctx: (ctx.sender(),)),
+    ("群一周内条数", "SELECT COUNT(*) FROM chat_messages WHERE group_name = ? AND created_at >= ?",
+     lambda ctx: (ctx.group(), ctx.timestamp(ctx.end - timedelta(days=7)))),
+    ("全部最近50条", "SELECT * FROM chat_messages ORDER BY created_at DESC LIMIT 50",
+     lambda ctx: ()),
+]
+
+
+class Context:
+    """生成数据和查询参数"""
+
+    def __init__(self, rows, groups, senders, days, seed):
+        self.rows = rows
+        self.groups = [f"群聊{i:04d}" for i in range(groups)]
+        self.senders = [f"wxid_{i:06d}" for i in range(senders)]
+        self.end = datetime(2024, 6, 30)
+        self.start = self.end - timedelta(days=days)
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def timestamp(value: datetime) -> str:
+        # 与 SQLAlchemy DateTime 在 SQLite 中的存储格式一致
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def group(self):
+        return self.random.choice(self.groups)
+
+    def sender(self):
+        return self.random.choice(self.senders)
+
+    def generate(self, count, start=None):
+        """按时间顺序生成聊天记录"""
+        start = start or self.start
+        step = (self.end - start) / max(count, 1)
+        for i in range(count):
+            sender = self.sender()
+            yield (sender, sender, self.group(), f"问题 {i} " + "x" * self.random.randint(5, 40),
+                   "回复 " + "y" * self.random.randint(20, 120), "deepseek", "",
+                   self.timestamp(start + step * i))
+
+
+def create_schema(path):
+    from sqlalchemy import create_engine
+    from core.db_models import Base
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+
+def populate(path, ctx, chunk=100_000):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    started = time.perf_counter()
+    rows = ctx.generate(ctx.rows)
+    done = 0
+    while done < ctx.rows:
+        batch = [row for _, row in zip(range(chunk), rows)]
+        conn.executemany(INSERT_SQL, batch)
+        conn.commit()
+        done += len(batch)
+        print(f"\r生成数据: {done:,}/{ctx.rows:,}", end="", flush=True)
+    print(f"\r生成数据: {done:,} 行，用时 {time.perf_counter() - started:.1f} 秒")
+    conn.close()
+
+
+def connect(path, tuned):
+    conn = sqlite3.connect(path)
+    if tuned:
+        for pragma in sqlite_pragmas(SQLITE_PROFILE):
+            conn.execute(pragma)
+    else:
+        conn.execute("PRAGMA journal_mode=DELETE")  # WAL 会持久保存在文件中，默认配置需要显式切回
+    return conn
+
+
+def timed(func, repeat):
+    """返回每次耗时（毫秒）的中位数和 p95"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def run_phase(path, ctx, tuned, repeat, batches, batch_size):
+    conn = connect(path, tuned)
+    results = {}
+    for name, sql, params in QUERIES:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params(ctx)).fetchall()
+        results[name] = timed(lambda: conn.execute(sql, params(ctx)).fetchall(), repeat)
+        print(f"  {name}: {' / '.join(row[-1] for row in plan)}")
+
+    def delete_old():
+        # 与 delete_messages(group_name, before_date) 相同的条件，执行后回滚保持数据不变
+        conn.execute("DELETE FROM chat_messages WHERE group_name = ? AND created_at < ?",
+                     (ctx.group(), ctx.timestamp(ctx.start + timedelta(days=30))))
+        conn.rollback()
+    results["删除群旧记录"] = timed(delete_old, max(1, repeat // 4))
+
+    new_rows = ctx.generate(batches * batch_size + batches, start=ctx.end)
+
+    def insert_one():
+        # 旧的写法：每条回复一个事务
+        conn.execute(INSERT_SQL, next(new_rows))
+        conn.commit()
+    results["单条写入"] = timed(insert_one, batches)
+
+    def insert_batch():
+        conn.executemany(INSERT_SQL, [next(new_rows) for _ in range(batch_size)])
+        conn.commit()
+    results[f"批量写入({batch_size}条)"] = timed(insert_batch, batches)
+
+    conn.execute("DELETE FROM chat_messages WHERE created_at >= ?", (ctx.timestamp(ctx.end),))
+    conn.commit()
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记录数据库基准测试")
+    parser.add_argument("--path", default=os.path.join("data", "bench_chat_history.db"))
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--groups", type=int, default=300)
+    parser.add_argument("--senders", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询执行的次数")
+    parser.add_argument("--batches", type=int, default=20, help="写入测试的事务数")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reuse", action="store_true", help="使用已生成的数据库（需先删除索引）")
+    parser.add_argument("--keep", action="store_true", help="测试结束后保留数据库文件")
+    args = parser.parse_args()
+
+    ctx = Context(args.rows, args.groups, args.senders, args.days, args.seed)
+    os.makedirs(os.path.dirname(args.path) or ".", exist_ok=True)
+    if args.reuse and os.path.exists(args.path):
+        conn = sqlite3.connect(args.path)
+        conn.execute("DROP INDEX IF EXISTS ix_chat_messages_group_created")
+        conn.execute("DROP INDEX IF EXISTS ix_chat_messages_sender_created")
+        conn.close()
+    else:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+        create_schema(args.path)
+        populate(args.path, ctx)
+
+    print("默认配置:")
+    baseline = run_phase(args.path, ctx, False, args.repeat, args.batches, args.batch_size)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.path)
+    for statement in SQLITE_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+    print(f"创建索引用时 {time.perf_counter() - started:.1f} 秒")
+
+    print("优化配置:")
+    tuned = run_phase(args.path, ctx, True, args.repeat, args.batches, args.batch_size)
+
+    size = sum(os.path.getsize(args.path + s) for s in ("", "-wal") if os.path.exists(args.path + s))
+    print(f"\n{ctx.rows:,} 行，数据库 {size / 1024 / 1024:.0f} MB，耗时为中位数 / p95（毫秒）")
+    print(f"{'操作':<16}{'默认配置':>22}{'优化配置':>22}{'加速':>10}")
+    for name in baseline:
+        (b50, b95), (t50, t95) = baseline[name], tuned[name]
+        print(f"{name:<16}{b50:>12.2f} / {b95:<9.2f}{t50:>12.2f} / {t95:<9.2f}{b50 / t50 if t50 else 0:>9.1f}x")
+
+    if not args.keep:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+
+if __name__ == "__main__":
+    main()
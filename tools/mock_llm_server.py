@@ -0,0 +1,349 @@
+"""本地 OpenAI 兼容模拟服务，用于不花费 token、不联网地压测机器人
+
+实现 /v1/chat/completions（含 stream=True 的 SSE 流式输出）和 /v1/models，
+可配置首字延迟分布、输出速度、错误注入（429/500/超时）以及固定或回声回复。
+
+用法：
+    python tools/mock_llm_server.py --port 8765 --latency lognormal:0.8,0.5 --tps 40 \\
+        --error-429 0.05 --error-500 0.02 --timeout-rate 0.01 --mode echo
+
+然后把 config.json 中 ai_settings.deepseek.base_url（或 qianwen）设为
+http://127.0.0.1:8765/v1（API密钥随意填写），整个 AI 调用链路都会请求本服务。
+
+运行中可通过 POST /admin/config 修改配置（JSON，字段与 --config 文件相同），
+GET /stats 查看请求统计。
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {
+    "latency": "lognormal:0.6,0.4",  # 首字延迟分布（秒）
+    "tokens_per_second": 50.0,       # 输出速度
+    "error_429": 0.0,                # 返回 429 的概率
+    "error_500": 0.0,                # 返回 500 的概率
+    "timeout_rate": 0.0,             # 不响应（挂起后断开）的概率
+    "hang_seconds": 120.0,           # 超时注入时挂起的时间
+    "retry_after": 1.0,              # 429 响应的 Retry-After（秒），<=0 时不返回该头
+    "mode": "echo",                  # echo / canned / lorem
+    "replies": ["这是来自本地模拟服务的回复。"],
+    "lorem_tokens": 120,             # lorem 模式下的回复长度
+    "models": ["deepseek-chat", "qwen-turbo"],
+    "api_key": None,                 # 设置后校验 Authorization，密钥不符时返回 401
+    "seed": None,
+}
+
+_LOREM = ("模拟 回复 内容 用于 压测 机器人 的 吞吐 延迟 以及 重试 行为 "
+          "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod").split()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符每字一个，其余每 4 个字符一个"""
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af")
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """按分布描述采样延迟：fixed:x、uniform:a,b、normal:mean,std、lognormal:median,sigma、exponential:mean"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        value = values[0]
+    elif kind == "uniform":
+        value = rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        value = rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        value = values[0] * math.exp(rng.gauss(0, values[1]))
+    elif kind == "exponential":
+        value = rng.expovariate(1 / values[0])
+    else:
+        raise ValueError(f"未知的延迟分布: {spec}")
+    return max(0.0, value)
+
+
+class MockState:
+    """服务配置和统计（所有请求线程共享）"""
+
+    def __init__(self, config: dict):
+        self.lock = threading.Lock()
+        self.config = dict(DEFAULT_CONFIG)
+        self.rng = random.Random()
+        self.update(config)
+        self.stats = {"requests": 0, "streams": 0, "ok": 0, "429": 0, "500": 0, "timeouts": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+        self._seen_prefixes = set()  # 模拟前缀缓存命中
+
+    def update(self, config: dict):
+        with self.lock:
+            merged = {**self.config, **{k: v for k, v in config.items() if k in DEFAULT_CONFIG}}
+            sample_latency(merged["latency"], random.Random())  # 先校验分布描述，无效时不修改配置
+            self.config = merged
+            if self.config["seed"] is not None:
+                self.rng.seed(self.config["seed"])
+
+    def count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+    def roll(self) -> str:
+        """决定本次请求的结果：ok / 429 / 500 / timeout"""
+        with self.lock:
+            x = self.rng.random()
+            for outcome, key in (("429", "error_429"), ("500", "error_500"), ("timeout", "timeout_rate")):
+                if x < self.config[key]:
+                    return outcome
+                x -= self.config[key]
+            return "ok"
+
+    def latency(self) -> float:
+        with self.lock:
+            return sample_latency(self.config["latency"], self.rng)
+
+    def reply(self, messages: list) -> str:
+        with self.lock:
+            mode = self.config["mode"]
+            if mode == "canned":
+                return self.rng.choice(self.config["replies"])
+            if mode == "lorem":
+                return " ".join(self.rng.choice(_LOREM) for _ in range(self.config["lorem_tokens"]))
+        last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        return f"Echo: {last}"
+
+    def cached_tokens(self, messages: list) -> int:
+        """同一系统提示词再次出现时，把它计为已缓存的提示 token"""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        content = messages[0].get("content", "")
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self.lock:
+            seen = key in self._seen_prefixes
+            self._seen_prefixes.add(key)
+        return estimate_tokens(content) if seen else 0
+
+
+def split_tokens(text: str) -> list:
+    """把回复切成约一个 token 大小的片段，用于流式输出"""
+    pieces, buf = [], ""
+    for ch in text:
+        buf += ch
+        if "\u2e80" <= ch <= "\u9fff" or len(buf) >= 4 or ch == " ":
+            pieces.append(buf)
+            buf = ""
+    if buf:
+        pieces.append(buf)
+    return pieces
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _authorized(self) -> bool:
+        """校验API密钥（未配置 api_key 时不校验）"""
+        expected = self.state.config["api_key"]
+        if not expected or self.headers.get("Authorization") == f"Bearer {expected}":
+            return True
+        self._send_json(401, {"error": {"message": "Incorrect API key provided (mock)",
+                                        "type": "authentication_error", "code": "invalid_api_key"}})
+        return False
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path in ("/v1/models", "/models") and not self._authorized():
+            return
+        if path in ("/v1/models", "/models"):
+            models = self.state.config["models"]
+            self._send_json(200, {"object": "list", "data": [
+                {"id": name, "object": "model", "owned_by": "mock"} for name in models
+            ]})
+        elif path == "/stats":
+            with self.state.lock:
+                stats = dict(self.state.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json", "type": "invalid_request_error"}})
+            return
+
+        if path == "/admin/config":
+            try:
+                self.state.update(body)
+            except (ValueError, IndexError) as e:
+                self._send_json(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+                return
+            self._send_json(200, self.state.config)
+        elif path in ("/v1/chat/completions", "/chat/completions"):
+            if self._authorized():
+                self._chat_completions(body)
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def _chat_completions(self, body: dict):
+        state = self.state
+        state.count("requests")
+        outcome = state.roll()
+        if outcome == "429":
+            state.count("429")
+            retry_after = state.config["retry_after"]
+            headers = {"Retry-After": f"{retry_after:g}"} if retry_after > 0 else {}
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)",
+                                            "type": "rate_limit_error", "code": "rate_limit_exceeded"}}, headers)
+            return
+        if outcome == "500":
+            state.count("500")
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+            return
+        if outcome == "timeout":
+            state.count("timeouts")
+            time.sleep(state.config["hang_seconds"])
+            self.close_connection = True
+            return
+
+        messages = body.get("messages") or []
+        model = body.get("model") or state.config["models"][0]
+        text = state.reply(messages)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = estimate_tokens(text)
+        cached = state.cached_tokens(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},   # OpenAI 风格
+            "prompt_cache_hit_tokens": cached,                     # DeepSeek 风格
+            "prompt_cache_miss_tokens": prompt_tokens - cached,
+        }
+        state.count("prompt_tokens", prompt_tokens)
+        state.count("completion_tokens", completion_tokens)
+
+        time.sleep(state.latency())
+        tps = max(float(state.config["tokens_per_second"]), 0.001)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            state.count("streams")
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            self._stream(completion_id, created, model, text, tps, usage if include_usage else None)
+        else:
+            time.sleep(completion_tokens / tps)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        state.count("ok")
+
+    def _stream(self, completion_id: str, created: int, model: str, text: str, tps: float, usage: dict):
+        """SSE 流式输出，按 tokens_per_second 的速度逐段发送"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: dict, finish_reason=None, choices=True, extra=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else []}
+            payload.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for piece in split_tokens(text):
+                time.sleep(estimate_tokens(piece) / tps)
+                chunk({"content": piece})
+            chunk({}, "stop")
+            if usage:
+                chunk({}, choices=False, extra={"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端提前断开（例如请求被取消）
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8765, config: dict = None) -> ThreadingHTTPServer:
+    """创建模拟服务（可在测试脚本中于后台线程运行 serve_forever）"""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"state": MockState(config or {})})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", help="JSON 配置文件（字段同 DEFAULT_CONFIG）")
+    parser.add_argument("--latency", help="首字延迟分布，如 fixed:0.5、uniform:0.2,1.5、lognormal:0.8,0.5")
+    parser.add_argument("--tps", type=float, dest="tokens_per_second", help="输出速度（tokens/s）")
+    parser.add_argument("--error-429", type=float, dest="error_429", help="返回 429 的概率")
+    parser.add_argument("--error-500", type=float, dest="error_500", help="返回 500 的概率")
+    parser.add_argument("--timeout-rate", type=float, dest="timeout_rate", help="不响应的概率")
+    parser.add_argument("--hang-seconds", type=float, dest="hang_seconds", help="超时注入时挂起的秒数")
+    parser.add_argument("--retry-after", type=float, dest="retry_after", help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--mode", choices=["echo", "canned", "lorem"])
+    parser.add_argument("--reply", action="append", dest="replies", help="固定回复（可重复，随机选择）")
+    parser.add_argument("--lorem-tokens", type=int, dest="lorem_tokens")
+    parser.add_argument("--api-key", dest="api_key", help="要求客户端使用的API密钥")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    config.update({k: v for k, v in vars(args).items()
+                   if k in DEFAULT_CONFIG and v is not None})
+    if args.replies and "mode" not in config:
+        config["mode"] = "canned"
+
+    server = create_server(args.host, args.port, config)
+    print(f"模拟服务已启动: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -159,6 +159,12 @@ class MainWindow(QMainWindow):
         self.status_label = QLabel("当前状态: 未运行")
         self.status_label.setStyleSheet("color: #86868B;")
         status_layout.addWidget(self.status_label)
+
+        # 各模型的连接状态
+        self.provider_label = QLabel("")
+        self.provider_label.setStyleSheet("color: #86868B; font-size: 11px;")
+        self.provider_label.hide()
+        status_layout.addWidget(self.provider_label)
         
         # 触发词显示和编辑（新的一行）
         trigger_widget = QWidget()
@@ -489,6 +495,23 @@ class MainWindow(QMainWindow):
             trigger_word = self.trigger_edit.text().strip()
             self.status_label.setText(f"当前状态: 已停止 (触发词: @{trigger_word})")
 
+    def update_provider_status(self, health: dict):
+        """显示各模型的连接状态（就绪时附带探测耗时）"""
+        names = {"deepseek": "DeepSeek", "gemini": "Gemini", "qianwen": "通义千问"}
+        texts = {"unknown": "等待", "probing": "连接中", "auth_error": "密钥无效",
+                 "unreachable": "无法连接", "error": "异常"}
+        parts = []
+        for name, item in health.items():
+            if item["status"] == "ready":
+                parts.append(f"{names.get(name, name)} ✓ {item['last_latency'] * 1000:.0f}ms")
+            else:
+                parts.append(f"{names.get(name, name)} {texts.get(item['status'], item['status'])}")
+        self.provider_label.setText("模型: " + " | ".join(parts) if parts else "")
+        self.provider_label.setToolTip("\n".join(
+            f"{names.get(name, name)}: {item['error']}" for name, item in health.items() if item["error"]
+        ))
+        self.provider_label.setVisible(bool(parts))
+
     def show_settings(self):
         """显示设置对话框"""
         dialog = SettingsDialog(self.config, self.chat, self)
@@ -523,15 +546,19 @@ class MainWindow(QMainWindow):
             # 保存设置
             self.save_window_settings()
             
-            # 确保数据库连接关闭
-            self.db.close()
-            
             # 清理聊天管理器资源
             self.chat.cleanup()
             
             # 停止所有异步任务
             if hasattr(self.app, 'loop'):
                 loop = self.app.loop
+                # 保存模型统计并关闭共享连接池（需要在事件循环关闭前完成）
+                try:
+                    loop.run_until_complete(self.chat.ai.close())
+                except Exception as e:
+                    print(f"关闭AI连接失败: {e}")
+                    self.chat.ai.provider_stats.save()
+
                 # 取消所有正在运行的任务
                 for task in asyncio.all_tasks(loop):
                     task.cancel()
@@ -552,6 +579,9 @@ class MainWindow(QMainWindow):
                 except:
                     pass
             
+            # 所有任务结束后写完队列中的聊天记录并关闭数据库
+            self.db.close()
+
             # 清理应用程序资源
             self.app.cleanup()
             
@@ -565,6 +595,7 @@ class MainWindow(QMainWindow):
             
         except Exception as e:
             print(f"关闭应用程序时发生错误: {e}")
+            self.db.close()  # 出错时也要写完尚未保存的记录
             self._force_quit()
 
     def _force_quit(self):
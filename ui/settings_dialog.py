@@ -98,7 +98,7 @@ class SettingsDialog(QDialog):
         model_layout = QHBoxLayout()
         model_layout.addWidget(QLabel("默认模型:"))
         self.model_combo = QComboBox()
-        self.model_combo.addItems(["deepseek", "gemini", "qianwen"])
+        self.model_combo.addItems(["deepseek", "gemini", "qianwen", "auto"])
         model_layout.addWidget(self.model_combo)
         api_layout.addLayout(model_layout)
 
@@ -150,6 +150,21 @@ class SettingsDialog(QDialog):
         
         tab_widget.addTab(prompt_tab, "提示词设置")
 
+        # 模型状态页
+        stats_tab = QWidget()
+        stats_layout = QVBoxLayout(stats_tab)
+        stats_layout.setContentsMargins(5, 5, 5, 5)
+
+        self.stats_view = QTextEdit()
+        self.stats_view.setReadOnly(True)
+        stats_layout.addWidget(self.stats_view)
+
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.load_provider_stats)
+        stats_layout.addWidget(refresh_btn)
+
+        tab_widget.addTab(stats_tab, "模型状态")
+
         # 确定取消按钮
         button_layout = QHBoxLayout()
         button_layout.setSpacing(8)
@@ -190,9 +205,59 @@ class SettingsDialog(QDialog):
         # 系统提示词
         self.system_prompt.setText(self.config.get_system_prompt())
 
+        # 模型状态
+        self.load_provider_stats()
+
         # 连接代理复选框信号
         self.gemini_proxy_check.stateChanged.connect(self._on_proxy_check_changed)
 
+    def load_provider_stats(self):
+        """显示各模型的实时统计"""
+        def fmt(value, unit="s"):
+            return "-" if value is None else f"{value:.2f}{unit}"
+
+        stats = self.chat.ai.get_provider_stats()
+        lines = [] if stats else ["暂无统计数据"]
+        for name, item in stats.items():
+            lines.append(f"{name}")
+            lines.append(f"  平均耗时(EWMA): {fmt(item['ewma_latency'])}")
+            lines.append(f"  p50/p95/p99: {fmt(item['p50'])} / {fmt(item['p95'])} / {fmt(item['p99'])}")
+            lines.append(f"  错误率: {item['error_rate'] * 100:.1f}%")
+            lines.append(f"  输出速度: {fmt(item['tokens_per_second'], ' tokens/s')}")
+            lines.append(f"  调用次数: {item['calls']}")
+
+        history = self.chat.ai.get_history_stats()
+        lines.append("")
+        lines.append(f"对话历史: {len(history['groups'])} 个群, 约 {history['total_bytes'] / 1024:.1f} KB, "
+                     f"已淘汰 {history['evictions']} 次")
+        groups = sorted(history["groups"].items(), key=lambda item: item[1]["bytes"], reverse=True)
+        for name, item in groups:
+            lines.append(f"  {name}: {item['turns']} 条, {item['tokens']} tokens, {item['bytes'] / 1024:.1f} KB")
+
+        dispatch = self.chat.get_dispatch_stats()
+        flight = self.chat.ai.get_single_flight_stats()
+        lines.append("")
+        lines.append(f"相同问题合并: 群内 {dispatch['coalesced']} 条, 跨群常见问题 {flight['shared']} 次")
+
+        writer = self.chat.db.get_writer_stats()
+        lines.append("")
+        lines.append(f"数据库写入: 队列 {writer['queue_depth']}/{writer['capacity']} (峰值 {writer['max_queue_depth']}), "
+                     f"已写入 {writer['rows_written']} 条 / {writer['batches']} 批 (平均 {writer['avg_batch']:.1f} 条)")
+        lines.append(f"  刷新耗时: 最近 {fmt(writer['last_flush_ms'], 'ms')}, 平均 {fmt(writer['avg_flush_ms'], 'ms')}, "
+                     f"最大 {fmt(writer['max_flush_ms'], 'ms')}; 失败 {writer['failed']}, 丢弃 {writer['dropped']}")
+
+        usage = self.chat.ai.get_usage_rollup(days=1)
+        if usage:
+            currency = self.config.config.get("pricing", {}).get("currency", "CNY")
+            lines.append("")
+            lines.append("今日用量:")
+            for item in usage:
+                lines.append(f"  {item['group_name'] or '-'}: {item['calls']} 次, "
+                             f"输入 {item['prompt_tokens']} / 输出 {item['completion_tokens']} tokens, "
+                             f"缓存命中 {item['cache_hit_rate'] * 100:.0f}%, "
+                             f"前缀 {item['prefixes']} 种, {item['cost']:.4f} {currency}")
+        self.stats_view.setPlainText("\n".join(lines))
+
     def _on_proxy_check_changed(self, state):
         """处理代理复选框状态变化"""
         enabled = bool(state)